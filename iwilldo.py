@@ -3,32 +3,118 @@
 #
 # This file is an original work developed by Opera Software ASA.
 
+import bisect
+import codecs
+import collections
+import contextlib
+import concurrent.futures
+import gzip
+import hashlib
+import http.client
+import importlib.machinery
 import json
 import os.path
 import re
+import socket
 import subprocess
 import sys
 import tempfile
 import threading
-import urllib.error
-import urllib.request
+import traceback
+import urllib.parse
+import zlib
 from functools import partial
-from time import gmtime, sleep, strftime
+from time import gmtime, monotonic, strftime, time
 
 import sublime
 import sublime_plugin
 
+# Base URL of the API, unless overridden by the pref.
 API_HOST = 'https://browser-resources.oslo.osa/'
-API_LATEST_LIST_URL = API_HOST + 'api/iwilldo/combined/latest'
-API_UPDATE_ITEM_URL = API_HOST + 'api/iwilldo/items/%s/'
+# Paths of the API endpoints, relative to the base URL.
+API_LATEST_LIST_PATH = 'api/iwilldo/combined/latest'
+API_UPDATE_ITEM_PATH = 'api/iwilldo/items/%s/'
+API_LIST_EVENTS_PATH = 'api/iwilldo/combined/events'
 API_USER_TOKEN_URL = API_HOST + 'api/obtain-token?format=json'
 # Interval (in seconds) at which the list is updated when the buffer is active.
 CHECK_INTERVAL_SEC = 15
+# Interval (in seconds) at which the list is updated when the buffer is in a
+# background tab. Zero disables updates of hidden lists.
+HIDDEN_CHECK_INTERVAL_SEC = 120
+# Upper bound (in seconds) of the update interval while updates are failing.
+MAX_BACKOFF_INTERVAL_SEC = 300
+# Interval (in seconds) at which the list is still polled while push updates
+# are connected, in case a notification was missed.
+PUSH_RESYNC_INTERVAL_SEC = 300
+# Time (in seconds) without any data, keep-alives included, after which the
+# push connection is considered dead.
+PUSH_READ_TIMEOUT_SEC = 90
+# Delay (in seconds) before reconnecting a dropped push connection. Doubles
+# with every failed attempt, up to MAX_BACKOFF_INTERVAL_SEC.
+PUSH_RECONNECT_INTERVAL_SEC = 5
+# Interval (in seconds) at which the whole list is fetched again even though
+# the server supports fetching only the changes.
+FULL_SYNC_INTERVAL_SEC = 600
+# Timeout (in seconds) of network operations, unless overridden by the pref.
+HTTP_TIMEOUT_SEC = 30
+# Maximum number of idle connections kept open per host.
+HTTP_MAX_IDLE_CONNECTIONS = 2
+# Number of most recent requests used for computing latency stats.
+HTTP_LATENCY_SAMPLES = 100
+# Size (in bytes) of the chunks in which streamed response bodies are read.
+HTTP_READ_CHUNK_SIZE = 64 * 1024
+# Delay (in seconds) between the first and the second partial render of a
+# list that is still being downloaded. Doubles after every partial render.
+PARTIAL_LIST_FLUSH_INTERVAL_SEC = 0.1
+# Number of most recent timings kept for every kind of operation.
+TIMING_SAMPLES = 100
+# Maximum number of requests waiting on the network queue.
+NETWORK_QUEUE_MAX_PENDING = 512
+# Default number of threads parsing copied info of the files.
+COPIED_INFO_WORKERS = 4
+# Number of files parsed by a single copied info job.
+COPIED_INFO_BATCH_SIZE = 50
+# Minimum interval (in seconds) between partial copied info updates sent to
+# the view while the files are being parsed.
+COPIED_INFO_FLUSH_INTERVAL_SEC = 0.25
+# Maximum number of git commands waiting on the git queue.
+GIT_QUEUE_MAX_PENDING = 512
+# Maximum number of upstream diffs kept in memory.
+DIFF_CACHE_MAX_ENTRIES = 200
+# Maximum number of unhandled items, following the cursor, whose upstream
+# diffs are prefetched. Leaves room in the cache for the diffs that are shown.
+DIFF_PREFETCH_MAX_ITEMS = DIFF_CACHE_MAX_ENTRIES // 2
+# Number of commits added to the git log panel at a time.
+GIT_LOG_PAGE_SIZE = 200
+# Maximum number of file logs and shown commits kept in memory.
+GIT_LOG_CACHE_MAX_ENTRIES = 50
+GIT_SHOW_CACHE_MAX_ENTRIES = 50
+# Maximum number of jobs waiting on the file IO queue.
+FILE_IO_QUEUE_MAX_PENDING = 64
+# Default number of merge tools and comparisons running at the same time.
+MAX_RUNNING_PROCESS_JOBS = 2
+# Maximum number of merges and comparisons waiting for their turn.
+PROCESS_JOBS_MAX_PENDING = 256
+# Number of finished merges and comparisons listed in the jobs panel.
+FINISHED_PROCESS_JOBS_SHOWN = 50
+# Version of the format of the list snapshots saved on disk.
+SNAPSHOT_VERSION = 1
+# Above this number of changed line blocks the list is re-rendered at once
+# instead of being patched line by line.
+MAX_INCREMENTAL_EDITS = 200
 # Pref name constants.
 PREF_NAME_USERNAME = 'will_do_list_username'
 PREF_NAME_REPOROOT = 'will_do_list_repo_root'
 PREF_NAME_AUTHTOKEN = 'will_do_list_auth_token'
 PREF_NAME_MERGETOOL = 'will_do_list_merge_tool'
+PREF_NAME_HTTP_TIMEOUT = 'will_do_list_http_timeout'
+PREF_NAME_CHECK_INTERVAL = 'will_do_list_check_interval'
+PREF_NAME_HIDDEN_CHECK_INTERVAL = 'will_do_list_hidden_check_interval'
+PREF_NAME_COPIED_INFO_WORKERS = 'will_do_list_copied_info_workers'
+PREF_NAME_TIMINGS_LOG = 'will_do_list_timings_log'
+PREF_NAME_API_HOST = 'will_do_list_api_host'
+PREF_NAME_PUSH_UPDATES = 'will_do_list_push_updates'
+PREF_NAME_MAX_RUNNING_JOBS = 'will_do_list_max_running_jobs'
 PACKAGE_PATH = 'Packages/IntakeToolkit'
 # Supported keyboard shortcuts.
 COMMANDS = [
@@ -59,7 +145,7 @@ COMMANDS = [
     ],
     [
         'alt+o',
-        'open upstream file',
+        'open upstream file at the clean upstream commit',
         'will_do_list_item_open_upstream'
     ],
     [
@@ -77,6 +163,16 @@ COMMANDS = [
         'jump to my next unhandled file',
         'will_do_list_go_to_next'
     ],
+    [
+        'f',
+        'show only some of the files',
+        'will_do_list_filter'
+    ],
+    [
+        'x',
+        'cancel the pending merges and comparisons',
+        'will_do_list_cancel_jobs'
+    ],
 ]
 # Message shown when the plugin is not configured.
 FIRST_USE_MESSAGE = '''
@@ -105,47 +201,1236 @@ def normalize_path(path):
   return path.strip().replace('\\', '/')
 
 
-def get_item_path(item):
-  """Returns absolute, normalized path to the given item.
+def make_item_path(name, reporoot):
+  """Returns absolute, normalized path to the item with the given name.
 
   Args:
-      item: The object which contains file item information, including the
-      'name' property bearing item's path relative to the repo root.
+      name: Item's path relative to the repo root, as shown in the list.
+      reporoot: Path of the repo root.
   """
-  return normalize_path(os.path.join(iwilldolist.get_reporoot(),
-                                     re.sub(r' \(ERROR\)$', '', item['name'])))
+  return normalize_path(os.path.join(reporoot,
+                                     re.sub(r' \(ERROR\)$', '', name)))
 
 
-def transform_path_absolute(path):
+def transform_path_absolute(path, reporoot):
   """Modifies the upstream path so that it's always absolute."""
-  path = normalize_path(path).replace(iwilldolist.get_reporoot() + '/', '')
+  path = normalize_path(path).replace(reporoot + '/', '')
   if not path.startswith('chromium/src/'):
     path = 'chromium/src/%s' % path
-  return '%s/%s' % (iwilldolist.get_reporoot(), path)
+  return '%s/%s' % (reporoot, path)
 
 
-def run_process(command, working_dir, dont_block=False):
-  """Wrapper around subprocess that hides console window on Windows."""
+def load_copied_file_class(lib_path):
+  """Returns the CopiedFile class of the libintake package at lib_path.
+
+  Checkouts might have different versions of the package so each one is
+  imported as a separate module, along with the modules of the package it
+  imports while it's loaded.
+  """
+  name = 'copied_file_%s' % hashlib.sha1(
+      lib_path.encode('utf-8')).hexdigest()[:16]
+  module = sys.modules.get(name)
+  if module is None:
+    lib_dir = os.path.join(os.path.abspath(lib_path), '')
+    # The package imports its own modules by their plain names.
+    sys.path.insert(0, lib_path)
+    loaded_names = set(sys.modules)
+    try:
+      module = importlib.machinery.SourceFileLoader(
+          name, os.path.join(lib_path, 'copied_file.py')).load_module()
+    finally:
+      sys.path.remove(lib_path)
+      # Drop the modules of the package from the cache, so that other
+      # checkouts import their own versions. The loaded module keeps
+      # references to them.
+      for module_name in set(sys.modules) - loaded_names:
+        module_file = getattr(sys.modules[module_name], '__file__', None)
+        if (module_name != name and module_file and
+            os.path.abspath(module_file).startswith(lib_dir)):
+          del sys.modules[module_name]
+  return module.CopiedFile
+
+
+def compute_line_edits(old_lines, old_keys, new_lines, new_keys, max_edits):
+  """Returns edits that turn old_lines into new_lines.
+
+  Each edit is a (start, end, lines) tuple replacing old_lines[start:end] with
+  lines. Edits are ordered by position. Lines are aligned by their keys, which
+  are unique within each of the lists, in linear time. Lines whose keys moved
+  up are removed and inserted again. Returns None as soon as there would be
+  more than max_edits edits.
+  """
+  old_positions = {key: index for index, key in enumerate(old_keys)}
+  edits = []
+
+  def add_edit(start, end, lines):
+    if edits and edits[-1][1] == start:
+      edits[-1][1] = end
+      edits[-1][2].extend(lines)
+      return True
+    edits.append([start, end, list(lines)])
+    return len(edits) <= max_edits
+
+  old_index = 0
+  for new_index, key in enumerate(new_keys):
+    line = new_lines[new_index]
+    position = old_positions.get(key, -1)
+    if position < old_index:
+      if not add_edit(old_index, old_index, [line]):
+        return None
+      continue
+    if position > old_index and not add_edit(old_index, position, []):
+      return None
+    if old_lines[position] != line and not add_edit(position, position + 1,
+                                                    [line]):
+      return None
+    old_index = position + 1
+  if old_index < len(old_lines) and not add_edit(old_index, len(old_lines),
+                                                 []):
+    return None
+  return [tuple(edit) for edit in edits]
+
+
+def find_word_spans(text, word, separator):
+  """Returns (start, end) spans of separator-delimited occurrences of word.
+
+  text may be empty or None, like claimed_by of unclaimed items.
+  """
+  if not text:
+    return []
+  spans = []
+  start = 0
+  for part in text.split(separator):
+    stripped = part.strip()
+    if stripped == word:
+      offset = start + part.index(stripped)
+      spans.append((offset, offset + len(word)))
+    start += len(part) + len(separator)
+  return spans
+
+
+def get_upstream_diff_command(copied_info, upstream_sha, reporoot):
+  """Returns git command showing upstream changes since the last sync."""
+  return ['git',
+          'diff',
+          '%s..%s' % (copied_info['last_synchronized'], upstream_sha),
+          '--exit-code',
+          '--',
+          transform_path_absolute(copied_info['copied_from_path'], reporoot)]
+
+
+def get_startupinfo():
+  """Returns startup info that hides the console window on Windows."""
   startupinfo = None
   if sublime.platform() == 'windows':
     # Don't let console window pop-up on Windows.
     startupinfo = subprocess.STARTUPINFO()
     startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
     startupinfo.wShowWindow = subprocess.SW_HIDE
-  process = subprocess.Popen(command,
-                             cwd=working_dir,
-                             stdin=subprocess.PIPE,
-                             stdout=(None if dont_block else subprocess.PIPE),
-                             stderr=(None if dont_block else subprocess.PIPE),
-                             startupinfo=startupinfo)
-  # No output when not blocking.
-  if dont_block:
-    return
-
-  output, error = process.communicate()
+  return startupinfo
+
+
+def get_process_timing_name(command):
+  # Time git calls separately for each subcommand.
+  return 'process: %s' % ' '.join(
+      command[:2] if command[0] == 'git' else command[:1])
+
+
+def run_process(command, working_dir):
+  """Wrapper around subprocess that hides console window on Windows."""
+  with timings.span(get_process_timing_name(command)):
+    process = subprocess.Popen(command,
+                               cwd=working_dir,
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               startupinfo=get_startupinfo())
+    output, error = process.communicate()
   return (str(output, "utf-8") if output else None, process.returncode)
 
 
+def submit_request(key, request):
+  """Queues a NetworkRequest, merging it into a pending one with the same
+  key."""
+  if not network_queue.submit(key, request, IWillDoList.NetworkRequest.merge):
+    sublime.set_timeout(partial(
+        sublime.status_message,
+        'IWillDo: too many pending requests, request dropped.'))
+
+
+def submit_process_job(view, description, command, working_dir):
+  """Queues an external process on the process runner."""
+  if not process_runner.submit(description, command, working_dir, view):
+    sublime.status_message(
+        'IWillDo: too many pending merges and comparisons, %s dropped.' %
+        description.lower())
+
+
+def get_duration_stats(durations):
+  """Returns mean, percentiles and maximum of durations in milliseconds."""
+  durations = sorted(durations)
+  if not durations:
+    return {}
+  return {
+      'mean_ms': 1000 * sum(durations) / len(durations),
+      'p50_ms': 1000 * durations[len(durations) // 2],
+      'p90_ms': 1000 * durations[int(len(durations) * 0.9)],
+      'p99_ms': 1000 * durations[int(len(durations) * 0.99)],
+      'max_ms': 1000 * durations[-1],
+  }
+
+
+class ListItem(object):
+  """A file in the IWillDo list."""
+
+  __slots__ = ('id', 'name', 'claimed_by', 'closed', 'owners', 'path')
+
+  def __init__(self, item_id, name, claimed_by, closed, owners, path):
+    self.id = item_id
+    self.name = name
+    self.claimed_by = claimed_by
+    self.closed = closed
+    # Tuple of mails of the users the item is assigned to. Shared by all the
+    # items of the group.
+    self.owners = owners
+    # Absolute, normalized path to the file.
+    self.path = path
+
+
+class ListGroup(object):
+  """Files in the IWillDo list assigned to the same users."""
+
+  __slots__ = ('title', 'owners', 'items')
+
+  def __init__(self, title, owners, items):
+    self.title = title
+    self.owners = owners
+    self.items = items
+
+
+class ListModel(object):
+  """The IWillDo list decoded from the JSON payload.
+
+  Owner tuples and items that didn't change are taken over from the previous
+  model so that refreshing the list doesn't allocate new objects for them.
+  """
+
+  __slots__ = ('error', 'bts_issue', 'title', 'base_commit', 'revision',
+               'groups', 'updated_at', 'stale', 'partial', '_reporoot',
+               '_owners_by_title', '_items_by_id', '_group_indices_by_item_id',
+               '_group_indices_by_title', '_index')
+
+  def __init__(self, data, reporoot, previous=None, updated_at=None,
+               stale=False, partial=False):
+    # Time at which the data was fetched.
+    self.updated_at = time() if updated_at is None else updated_at
+    # Whether the data was restored from a snapshot and might be outdated.
+    self.stale = stale
+    # Whether the rest of the list is still being downloaded.
+    self.partial = partial
+    # ListIndex of the items, built on first use.
+    self._index = None
+    self.error = data.get('error')
+    self.bts_issue = data.get('bts_issue')
+    self.title = data.get('title')
+    self.base_commit = data.get('base_commit')
+    # Revision of the list on the server, if it supports fetching changes
+    # since a revision.
+    self.revision = data.get('revision')
+    self.groups = []
+    self._reporoot = reporoot
+    self._owners_by_title = {}
+    self._items_by_id = {}
+    # Index of the group of each item in groups.
+    self._group_indices_by_item_id = {}
+    # Index of the first group with the title in groups.
+    self._group_indices_by_title = {}
+    previous_owners = {}
+    previous_items = {}
+    if previous and previous._reporoot == reporoot:
+      previous_owners = previous._owners_by_title
+      previous_items = previous._items_by_id
+    for group in data.get('groups', ()):
+      title = group['title']
+      owners = self._get_owners(title, previous_owners)
+      group_index = len(self.groups)
+      self._group_indices_by_title.setdefault(title, group_index)
+      items = []
+      for item_data in group['items']:
+        item = self._make_item(item_data, owners,
+                               previous_items.get(item_data['id']))
+        self._items_by_id[item.id] = item
+        self._group_indices_by_item_id[item.id] = group_index
+        items.append(item)
+      self.groups.append(ListGroup(title, owners, items))
+
+  def _get_owners(self, title, previous_owners):
+    owners = (self._owners_by_title.get(title) or
+              previous_owners.get(title) or
+              tuple(sys.intern(owner.strip()) for owner in title.split(',')))
+    self._owners_by_title[title] = owners
+    return owners
+
+  def _make_item(self, item_data, owners, previous_item):
+    """Returns previous_item if it's up to date or a new item otherwise."""
+    if (previous_item is not None and
+        previous_item.name == item_data['name'] and
+        previous_item.claimed_by == item_data['claimed_by'] and
+        previous_item.closed == item_data['closed'] and
+        previous_item.owners is owners):
+      return previous_item
+    return ListItem(item_data['id'],
+                    item_data['name'],
+                    item_data['claimed_by'],
+                    item_data['closed'],
+                    owners,
+                    make_item_path(item_data['name'], self._reporoot))
+
+  def apply_delta(self, delta):
+    """Returns a new model with the changes since a revision applied.
+
+    delta lists the changed items, each with the title of its group, and the
+    ids of the removed items. New items are added at the end of their group.
+    The groups and lookup tables are handed over to the new model instead of
+    being copied, so that the cost depends on the size of the delta, and
+    this model must not be used afterwards. Groups that change are copied.
+    """
+    model = ListModel({}, self._reporoot)
+    model.bts_issue = delta.get('bts_issue', self.bts_issue)
+    model.title = delta.get('title', self.title)
+    model.base_commit = delta.get('base_commit', self.base_commit)
+    model.revision = delta['revision']
+    model.groups = self.groups
+    model._owners_by_title = self._owners_by_title
+    model._items_by_id = self._items_by_id
+    model._group_indices_by_item_id = self._group_indices_by_item_id
+    model._group_indices_by_title = self._group_indices_by_title
+    group_indices_by_item_id = model._group_indices_by_item_id
+    group_indices_by_title = model._group_indices_by_title
+    # Indices of the groups that were already copied.
+    copied_groups = set()
+
+    def get_group_items(index):
+      if index not in copied_groups:
+        group = model.groups[index]
+        model.groups[index] = ListGroup(group.title, group.owners,
+                                        list(group.items))
+        copied_groups.add(index)
+      return model.groups[index].items
+
+    def remove_item(item):
+      get_group_items(group_indices_by_item_id.pop(item.id)).remove(item)
+
+    for item_id in delta.get('removed', ()):
+      item = model._items_by_id.pop(item_id, None)
+      if item is not None:
+        remove_item(item)
+    for item_data in delta.get('changed', ()):
+      title = item_data['group']
+      if title not in group_indices_by_title:
+        owners = model._get_owners(title, {})
+        group_indices_by_title[title] = len(model.groups)
+        copied_groups.add(len(model.groups))
+        model.groups.append(ListGroup(title, owners, []))
+      group_index = group_indices_by_title[title]
+      owners = model.groups[group_index].owners
+      previous_item = model._items_by_id.get(item_data['id'])
+      item = model._make_item(item_data, owners, previous_item)
+      if item is previous_item:
+        continue
+      model._items_by_id[item.id] = item
+      if previous_item is not None and previous_item.owners is owners:
+        # Several groups might have the same title. Keep the item in place.
+        items = get_group_items(group_indices_by_item_id[item.id])
+        items[items.index(previous_item)] = item
+        continue
+      if previous_item is not None:
+        remove_item(previous_item)
+      get_group_items(group_index).append(item)
+      group_indices_by_item_id[item.id] = group_index
+    return model
+
+  def copy(self):
+    """Returns a copy whose groups don't change when a delta is applied to
+    this model. The lookup tables are shared, so the copy is only for
+    reading."""
+    model = ListModel.__new__(ListModel)
+    for name in ListModel.__slots__:
+      setattr(model, name, getattr(self, name))
+    model.groups = list(self.groups)
+    return model
+
+  def get_items(self):
+    for group in self.groups:
+      for item in group.items:
+        yield item
+
+  def get_index(self):
+    if self._index is None:
+      self._index = ListIndex(self)
+    return self._index
+
+  def to_payload(self):
+    """Returns the list in the format of the JSON payload."""
+    return {
+        'bts_issue': self.bts_issue,
+        'title': self.title,
+        'base_commit': self.base_commit,
+        'revision': self.revision,
+        'groups': [{
+            'title': group.title,
+            'items': [{
+                'id': item.id,
+                'name': item.name,
+                'claimed_by': item.claimed_by,
+                'closed': item.closed,
+            } for item in group.items],
+        } for group in self.groups],
+    }
+
+
+class ListIndex(object):
+  """Lookup tables of the items of a list model, built once per model."""
+
+  __slots__ = ('_items', '_lowercase_names', '_ids_by_claimer',
+               '_ids_by_owner')
+
+  def __init__(self, model):
+    self._items = list(model.get_items())
+    self._lowercase_names = [item.name.lower() for item in self._items]
+    # Mapping from the username to ids of the items claimed by the user.
+    self._ids_by_claimer = {}
+    # Mapping from the mail to ids of the items assigned to the user.
+    self._ids_by_owner = {}
+    for item in self._items:
+      for username in (item.claimed_by or '').split():
+        self._ids_by_claimer.setdefault(username, set()).add(item.id)
+      for owner in item.owners:
+        self._ids_by_owner.setdefault(owner, set()).add(item.id)
+
+  def get_item_count(self):
+    return len(self._items)
+
+  def get_claimers(self):
+    return sorted(self._ids_by_claimer)
+
+  def get_ids_claimed_by(self, username):
+    return self._ids_by_claimer.get(username, set())
+
+  def get_ids_owned_by(self, usermail):
+    return self._ids_by_owner.get(usermail, set())
+
+  def get_ids_with_path(self, text):
+    """Returns ids of the items whose name contains text, ignoring case."""
+    text = text.lower()
+    return set(item.id
+               for item, name in zip(self._items, self._lowercase_names)
+               if text in name)
+
+  def get_ids_matching(self, predicate):
+    return set(item.id for item in self._items if predicate(item))
+
+
+class ListFilter(object):
+  """Selects the items shown in the list view."""
+
+  ALL = 'all'
+  MINE = 'mine'
+  UNHANDLED = 'unhandled'
+  CLAIMED_BY = 'claimed_by'
+  PATH = 'path'
+
+  def __init__(self, mode=ALL, argument=None):
+    self.mode = mode
+    # Username for CLAIMED_BY or the text for PATH.
+    self.argument = argument
+
+  def get_description(self):
+    if self.mode == ListFilter.MINE:
+      return 'My files'
+    if self.mode == ListFilter.UNHANDLED:
+      return 'Files not synchronized with the clean upstream'
+    if self.mode == ListFilter.CLAIMED_BY:
+      return 'Files claimed by %s' % self.argument
+    if self.mode == ListFilter.PATH:
+      return 'Files with "%s" in the path' % self.argument
+    return 'All files'
+
+  def depends_on_copied_info(self):
+    return self.mode == ListFilter.UNHANDLED
+
+  def get_visible_ids(self, index, username, usermail, is_synchronized):
+    """Returns ids of the items to show, or None if all are shown."""
+    if self.mode == ListFilter.MINE:
+      return (index.get_ids_owned_by(usermail) |
+              index.get_ids_claimed_by(username))
+    if self.mode == ListFilter.UNHANDLED:
+      return index.get_ids_matching(lambda item: not is_synchronized(item))
+    if self.mode == ListFilter.CLAIMED_BY:
+      return index.get_ids_claimed_by(self.argument)
+    if self.mode == ListFilter.PATH:
+      return index.get_ids_with_path(self.argument)
+    return None
+
+
+class ListPayloadDecoder(object):
+  """Incremental decoder of the list payload.
+
+  The payload is decoded as it's fed, so that the groups received so far can
+  be shown before the rest arrives. Groups are walked key by key and the
+  items of each group one by one, so that a large group isn't decoded again
+  from its start with every chunk. Other values are decoded once they are
+  followed by a delimiter. Only the part of the text that wasn't decoded yet
+  is kept.
+  """
+
+  _WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+  def __init__(self):
+    self._decoder = json.JSONDecoder()
+    self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+    self._buffer = ''
+    self._pos = 0
+    # What is expected next in the buffer.
+    self._state = 'object'
+    self._key = None
+    self._fields = {}
+    self._groups = []
+    # The group being decoded and its current key.
+    self._group = None
+    self._group_key = None
+
+  def get_group_count(self):
+    return len(self._groups)
+
+  def get_data(self):
+    """Returns the payload decoded so far."""
+    data = dict(self._fields)
+    data['groups'] = list(self._groups)
+    return data
+
+  def feed(self, chunk):
+    """Decodes what's possible after appending chunk of UTF-8 bytes."""
+    self._buffer = (self._buffer[self._pos:] +
+                    self._text_decoder.decode(chunk))
+    self._pos = 0
+    self._decode()
+
+  def close(self):
+    """Returns the whole payload. Raises ValueError if it's invalid."""
+    self._buffer = (self._buffer[self._pos:] +
+                    self._text_decoder.decode(b'', final=True))
+    self._pos = 0
+    self._decode()
+    if self._state != 'end':
+      raise ValueError('Incomplete list payload')
+    return self.get_data()
+
+  def _decode_value(self):
+    """Returns the value at the current position or raises ValueError."""
+    value, end = self._decoder.raw_decode(self._buffer, self._pos)
+    # A number might be continued in the next chunk.
+    if end >= len(self._buffer) or self._buffer[end] not in ' \t\n\r,:]}':
+      raise ValueError('Value not delimited yet')
+    self._pos = end
+    return value
+
+  def _decode_key(self):
+    """Returns the object key at the current position or raises
+    ValueError."""
+    if self._buffer[self._pos] != '"':
+      self._expect('"')
+    return self._decode_value()
+
+  def _expect(self, chars):
+    char = self._buffer[self._pos]
+    if char not in chars:
+      raise ValueError('Unexpected %r at %d in list payload' % (char,
+                                                                self._pos))
+    self._pos += 1
+    return char
+
+  def _decode(self):
+    buffer = self._buffer
+    while True:
+      self._pos = self._WHITESPACE_RE.match(buffer, self._pos).end()
+      if self._pos >= len(buffer):
+        return
+      state = self._state
+      if state == 'end':
+        raise ValueError('Extra data after list payload')
+      if state == 'object':
+        self._expect('{')
+        self._state = 'first_key'
+      elif state in ('first_key', 'key'):
+        if state == 'first_key' and buffer[self._pos] == '}':
+          self._pos += 1
+          self._state = 'end'
+          continue
+        try:
+          self._key = self._decode_key()
+        except ValueError:
+          if buffer[self._pos] != '"':
+            raise
+          return
+        self._state = 'colon'
+      elif state == 'colon':
+        self._expect(':')
+        self._state = 'groups' if self._key == 'groups' else 'value'
+      elif state == 'value':
+        try:
+          self._fields[self._key] = self._decode_value()
+        except ValueError:
+          return
+        self._state = 'next_key'
+      elif state == 'next_key':
+        self._state = 'key' if self._expect(',}') == ',' else 'end'
+      elif state == 'groups':
+        self._expect('[')
+        self._state = 'first_group'
+      elif state in ('first_group', 'group'):
+        if state == 'first_group' and buffer[self._pos] == ']':
+          self._pos += 1
+          self._state = 'next_key'
+          continue
+        self._expect('{')
+        self._group = {}
+        self._state = 'group_first_key'
+      elif state == 'next_group':
+        self._state = 'group' if self._expect(',]') == ',' else 'next_key'
+      elif state in ('group_first_key', 'group_key'):
+        if state == 'group_first_key' and buffer[self._pos] == '}':
+          self._pos += 1
+          self._end_group()
+          continue
+        try:
+          self._group_key = self._decode_key()
+        except ValueError:
+          if buffer[self._pos] != '"':
+            raise
+          return
+        self._state = 'group_colon'
+      elif state == 'group_colon':
+        self._expect(':')
+        self._state = ('items' if self._group_key == 'items'
+                       else 'group_value')
+      elif state == 'group_value':
+        try:
+          self._group[self._group_key] = self._decode_value()
+        except ValueError:
+          return
+        self._state = 'group_next_key'
+      elif state == 'group_next_key':
+        if self._expect(',}') == ',':
+          self._state = 'group_key'
+        else:
+          self._end_group()
+      elif state == 'items':
+        if buffer[self._pos] != '[':
+          self._state = 'group_value'
+          continue
+        self._pos += 1
+        self._group['items'] = []
+        self._state = 'first_item'
+      elif state in ('first_item', 'item'):
+        if state == 'first_item' and buffer[self._pos] == ']':
+          self._pos += 1
+          self._state = 'group_next_key'
+          continue
+        try:
+          self._group['items'].append(self._decode_value())
+        except ValueError:
+          return
+        self._state = 'next_item'
+      elif state == 'next_item':
+        self._state = ('item' if self._expect(',]') == ','
+                       else 'group_next_key')
+
+  def _end_group(self):
+    self._groups.append(self._group)
+    self._group = None
+    self._state = 'next_group'
+
+
+class SnapshotCopiedInfo(object):
+  """Copied info known without parsing the file.
+
+  Restored from a snapshot, or set while the file is being rewritten. The
+  file is only parsed when it's about to be modified.
+  """
+
+  __slots__ = ('_path', '_reporoot', '_fields', '_copied_file_class',
+               '_copied_file')
+
+  def __init__(self, path, reporoot, last_synchronized, copied_from_path,
+               copied_file_class):
+    self._path = path
+    self._reporoot = reporoot
+    self._fields = {
+        'last_synchronized': last_synchronized,
+        'copied_from_path': copied_from_path,
+    }
+    self._copied_file_class = copied_file_class
+    self._copied_file = None
+
+  def __getitem__(self, key):
+    return self._fields[key]
+
+  def set_last_sync(self, sha):
+    if self._copied_file is None:
+      self._copied_file = self._copied_file_class.create(
+          self._path, self._reporoot, allow_caching=False)
+    if self._copied_file:
+      self._copied_file.set_last_sync(sha)
+      self._fields['last_synchronized'] = sha
+
+
+class GitCatFileProcess(object):
+  """Long-lived git cat-file --batch process reading objects of a repository.
+
+  Safe to use from multiple threads. The process is started on first use and
+  restarted if it dies.
+  """
+
+  def __init__(self, repo_dir):
+    self._repo_dir = repo_dir
+    self._lock = threading.Lock()
+    self._process = None
+
+  def get_repo_dir(self):
+    return self._repo_dir
+
+  def _write_specs(self, specs):
+    try:
+      self._process.stdin.write(
+          ''.join(spec + '\n' for spec in specs).encode('utf-8'))
+      self._process.stdin.flush()
+    except OSError:
+      # Reading the output fails as well in this case.
+      pass
+
+  def _read_objects(self, specs):
+    # Write from another thread so that neither git nor we get blocked on a
+    # full pipe when many objects are requested.
+    writer = threading.Thread(target=self._write_specs, args=(specs,))
+    writer.start()
+    contents = []
+    stdout = self._process.stdout
+    for spec in specs:
+      header = stdout.readline().split()
+      if not header:
+        raise OSError('git cat-file exited unexpectedly')
+      if len(header) != 3 or header[1] == b'missing':
+        contents.append(None)
+        continue
+      size = int(header[2])
+      contents.append(stdout.read(size))
+      # Contents are followed by a newline.
+      stdout.read(1)
+    writer.join()
+    return contents
+
+  def read_objects(self, specs):
+    """Returns contents of objects named by specs in the <rev>:<path> format.
+
+    Contents are bytes, or None for objects that don't exist. All objects are
+    requested at once.
+    """
+    with self._lock:
+      for attempt in range(2):
+        if not self._process or self._process.poll() is not None:
+          self._process = subprocess.Popen(['git', 'cat-file', '--batch'],
+                                           cwd=self._repo_dir,
+                                           stdin=subprocess.PIPE,
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.DEVNULL,
+                                           startupinfo=get_startupinfo())
+        try:
+          with timings.span('process: git cat-file', objects=len(specs)):
+            return self._read_objects(specs)
+        except (OSError, ValueError):
+          self._close()
+          if attempt:
+            raise
+
+  def _close(self):
+    if self._process:
+      self._process.kill()
+      self._process.wait()
+      self._process = None
+
+  def close(self):
+    with self._lock:
+      self._close()
+
+
+class PooledHttpClient(object):
+  """HTTP client that keeps connections alive and reuses them between requests.
+
+  Safe to use from multiple threads. Each connection is used by one request at
+  a time and is returned to the pool once its response was fully read.
+  """
+
+  def __init__(self, timeout=HTTP_TIMEOUT_SEC,
+               max_idle_connections=HTTP_MAX_IDLE_CONNECTIONS):
+    self._lock = threading.Lock()
+    self._timeout = timeout
+    self._max_idle_connections = max_idle_connections
+    # Mapping from (scheme, netloc) to a list of idle connections.
+    self._idle_connections = {}
+    self._latencies = collections.deque(maxlen=HTTP_LATENCY_SAMPLES)
+    self._request_count = 0
+    self._reused_count = 0
+
+  def set_timeout(self, timeout):
+    with self._lock:
+      self._timeout = timeout
+
+  def _connect(self, key):
+    with self._lock:
+      timeout = self._timeout
+    scheme, netloc = key
+    if scheme == 'https':
+      return http.client.HTTPSConnection(netloc, timeout=timeout)
+    return http.client.HTTPConnection(netloc, timeout=timeout)
+
+  def _acquire(self, key):
+    with self._lock:
+      connections = self._idle_connections.get(key)
+      if connections:
+        return (connections.pop(), True)
+    return (self._connect(key), False)
+
+  def _release(self, key, connection):
+    with self._lock:
+      connections = self._idle_connections.setdefault(key, [])
+      if len(connections) < self._max_idle_connections:
+        connections.append(connection)
+        return
+    connection.close()
+
+  def close(self):
+    """Closes all idle connections."""
+    with self._lock:
+      pools = list(self._idle_connections.values())
+      self._idle_connections = {}
+    for connections in pools:
+      for connection in connections:
+        connection.close()
+
+  @staticmethod
+  def _decode_body(response, body):
+    encoding = (response.getheader('Content-Encoding') or '').lower()
+    if encoding == 'gzip':
+      return gzip.decompress(body)
+    if encoding == 'deflate':
+      return zlib.decompress(body)
+    return body
+
+  @staticmethod
+  def _stream_body(response, consumer):
+    encoding = (response.getheader('Content-Encoding') or '').lower()
+    decompressor = None
+    if encoding == 'gzip':
+      decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+      decompressor = zlib.decompressobj()
+    while True:
+      chunk = response.read(HTTP_READ_CHUNK_SIZE)
+      if not chunk:
+        break
+      consumer(decompressor.decompress(chunk) if decompressor else chunk)
+    if decompressor:
+      consumer(decompressor.flush())
+
+  def request(self, method, url, body=None, headers=None, consumer=None):
+    """Makes a request and returns a (status, reason, headers, body) tuple.
+
+    If consumer is given, the body of a successful response is passed to it
+    in decoded chunks as they arrive, instead of being returned.
+
+    Raises OSError or http.client.HTTPException when the request fails.
+    """
+    parts = urllib.parse.urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    path = parts.path or '/'
+    if parts.query:
+      path += '?' + parts.query
+    request_headers = {'Accept-Encoding': 'gzip'}
+    request_headers.update(headers or {})
+    start = monotonic()
+    connection, reused = self._acquire(key)
+    try:
+      try:
+        connection.request(method, path, body=body, headers=request_headers)
+        response = connection.getresponse()
+      except (http.client.BadStatusLine, ConnectionError):
+        if not reused:
+          raise
+        # The server has closed the idle connection in the meantime.
+        connection.close()
+        connection = self._connect(key)
+        reused = False
+        connection.request(method, path, body=body, headers=request_headers)
+        response = connection.getresponse()
+      if consumer and response.status == 200:
+        self._stream_body(response, consumer)
+        data = None
+      else:
+        data = self._decode_body(response, response.read())
+    except Exception:
+      connection.close()
+      raise
+    if response.will_close:
+      connection.close()
+    else:
+      self._release(key, connection)
+    with self._lock:
+      self._latencies.append(monotonic() - start)
+      self._request_count += 1
+      if reused:
+        self._reused_count += 1
+    return (response.status, response.reason, response.msg, data)
+
+  def get_latency_stats(self):
+    """Returns stats of the recent requests, with latencies in milliseconds."""
+    with self._lock:
+      latencies = list(self._latencies)
+      stats = {
+          'requests': self._request_count,
+          'reused_connections': self._reused_count,
+      }
+    stats.update(get_duration_stats(latencies))
+    return stats
+
+
+class PerformanceTimings(object):
+  """Thread-safe record of the durations of the recent operations.
+
+  Keeps the given number of most recent samples of every operation and
+  optionally appends all of them as JSON lines to a log file.
+  """
+
+  def __init__(self, max_samples):
+    self._lock = threading.Lock()
+    self._max_samples = max_samples
+    # Mapping from the operation name to a deque of durations in seconds.
+    self._samples = collections.OrderedDict()
+    self._log_path = None
+    # JSON lines waiting to be appended to the log file.
+    self._pending_log_lines = []
+
+  def set_log_path(self, log_path):
+    """Sets the file the timings are logged to, or None to disable logging."""
+    with self._lock:
+      self._log_path = log_path
+
+  @contextlib.contextmanager
+  def span(self, name, **details):
+    """Context manager timing the enclosed block.
+
+    Yields the details dictionary which can be amended within the block and
+    is included in the log.
+    """
+    start = monotonic()
+    try:
+      yield details
+    finally:
+      self.record(name, monotonic() - start, details)
+
+  def record(self, name, duration, details=None):
+    with self._lock:
+      if name not in self._samples:
+        self._samples[name] = collections.deque(maxlen=self._max_samples)
+      self._samples[name].append(duration)
+      if not self._log_path:
+        return
+      entry = {'time': time(), 'name': name, 'ms': round(1000 * duration, 3)}
+      entry.update(details or {})
+      self._pending_log_lines.append(json.dumps(entry) + '\n')
+      log_path = self._log_path
+    file_io_queue.submit(('timings_log', log_path),
+                         partial(self._write_log, log_path))
+
+  def _write_log(self, log_path):
+    with self._lock:
+      lines = self._pending_log_lines
+      self._pending_log_lines = []
+    try:
+      with open(log_path, 'a', encoding='utf-8') as log_file:
+        log_file.writelines(lines)
+    except OSError:
+      traceback.print_exc()
+
+  def get_stats(self):
+    """Returns a list of (name, count, stats) tuples, in order of appearance."""
+    with self._lock:
+      samples = [(name, list(durations))
+                 for name, durations in self._samples.items()]
+    return [(name, len(durations), get_duration_stats(durations))
+            for name, durations in samples]
+
+
+class LruCache(object):
+  """Thread-safe dictionary that keeps only the most recently used entries."""
+
+  def __init__(self, max_entries):
+    self._lock = threading.Lock()
+    self._max_entries = max_entries
+    self._entries = collections.OrderedDict()
+
+  def get(self, key, default=None):
+    with self._lock:
+      if key not in self._entries:
+        return default
+      self._entries.move_to_end(key)
+      return self._entries[key]
+
+  def put(self, key, value):
+    with self._lock:
+      self._entries[key] = value
+      self._entries.move_to_end(key)
+      while len(self._entries) > self._max_entries:
+        self._entries.popitem(last=False)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+
+class CoalescingWorkQueue(object):
+  """Runs queued jobs one at a time on a single worker thread.
+
+  Every job has a key. A job submitted while another one with the same key is
+  still pending replaces it (or is merged with it) instead of being queued
+  again, and moves to the end of the queue.
+  """
+
+  def __init__(self, name, max_pending):
+    self._name = name
+    self._max_pending = max_pending
+    self._condition = threading.Condition()
+    # Mapping from the key to a pending job, in the order of execution.
+    self._pending = collections.OrderedDict()
+    self._thread = None
+
+  def submit(self, key, job, merge=None, first=False):
+    """Queues job to be called on the worker thread.
+
+    Args:
+        key: Key identifying the job, or None if it shouldn't be coalesced.
+        job: A callable taking no arguments.
+        merge: Optional function called with the pending job and the new one
+        when the key is already queued. Returns the job to run instead.
+        first: Whether the job should be queued before all the pending jobs.
+
+    Returns False if the queue is full and the job was dropped.
+    """
+    if key is None:
+      key = object()
+    with self._condition:
+      if key in self._pending:
+        pending = self._pending[key]
+        self._pending[key] = merge(pending, job) if merge else job
+        self._pending.move_to_end(key, last=not first)
+        return True
+      if len(self._pending) >= self._max_pending:
+        return False
+      self._pending[key] = job
+      if first:
+        self._pending.move_to_end(key, last=False)
+      if not self._thread:
+        self._thread = threading.Thread(target=self._run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+      self._condition.notify()
+    return True
+
+  def _run(self):
+    while True:
+      with self._condition:
+        while not self._pending:
+          self._condition.wait()
+        key, job = self._pending.popitem(last=False)
+      try:
+        job()
+      except Exception:
+        traceback.print_exc()
+
+
+class ProcessJob(object):
+  """An external process run by the ProcessJobRunner."""
+
+  QUEUED = 'queued'
+  RUNNING = 'running'
+  SUCCEEDED = 'done'
+  FAILED = 'failed'
+  CANCELLED = 'cancelled'
+
+  def __init__(self, description, command, working_dir):
+    self.description = description
+    self.command = command
+    self.working_dir = working_dir
+    self.state = ProcessJob.QUEUED
+    self.returncode = None
+    # Output of the process, both stdout and stderr.
+    self.output = None
+    self.process = None
+
+
+class ProcessJobRunner(object):
+  """Runs external processes, at most max_running of them at a time.
+
+  Jobs wait in a bounded queue for their turn. Progress of the jobs
+  submitted since the runner was last idle is shown in the status bar of the
+  view that submitted them. Failures are reported with the exit status and
+  the output of the process.
+  """
+
+  STATUS_KEY = 'will_do_list_jobs'
+
+  def __init__(self, max_running, max_pending):
+    self._max_running = max_running
+    self._max_pending = max_pending
+    self._lock = threading.Lock()
+    self._pending = collections.deque()
+    self._running = []
+    # Jobs submitted since the runner was last idle.
+    self._batch = []
+    self._finished = collections.deque(maxlen=FINISHED_PROCESS_JOBS_SHOWN)
+    self._worker_count = 0
+    # View showing the progress in its status bar.
+    self._status_view = None
+
+  def set_max_running(self, max_running):
+    with self._lock:
+      self._max_running = max(1, max_running)
+    self._start_workers()
+
+  def submit(self, description, command, working_dir, view):
+    """Queues a process. Returns False if the queue is full."""
+    with self._lock:
+      if len(self._pending) >= self._max_pending:
+        return False
+      if not self._pending and not self._running:
+        self._batch = []
+      job = ProcessJob(description, command, working_dir)
+      self._pending.append(job)
+      self._batch.append(job)
+      self._status_view = view
+    self._start_workers()
+    self._show_progress()
+    return True
+
+  def cancel(self):
+    """Drops the queued jobs and terminates the running processes.
+
+    Returns the number of cancelled jobs.
+    """
+    with self._lock:
+      jobs = list(self._pending) + self._running
+      for job in self._pending:
+        job.state = ProcessJob.CANCELLED
+        self._finished.append(job)
+      self._pending.clear()
+      for job in self._running:
+        job.state = ProcessJob.CANCELLED
+        if job.process:
+          try:
+            job.process.terminate()
+          except OSError:
+            pass
+    self._show_progress()
+    return len(jobs)
+
+  def get_jobs(self):
+    """Returns the finished, running and queued jobs, in this order."""
+    with self._lock:
+      return list(self._finished) + self._running + list(self._pending)
+
+  def _start_workers(self):
+    with self._lock:
+      count = min(self._max_running, len(self._pending)) - self._worker_count
+      self._worker_count += max(0, count)
+    for _ in range(count):
+      thread = threading.Thread(target=self._run, name='IWillDo processes')
+      thread.daemon = True
+      thread.start()
+
+  def _run(self):
+    while True:
+      with self._lock:
+        if not self._pending or len(self._running) >= self._max_running:
+          self._worker_count -= 1
+          return
+        job = self._pending.popleft()
+        job.state = ProcessJob.RUNNING
+        self._running.append(job)
+      sublime.set_timeout(self._show_progress)
+      self._run_job(job)
+      with self._lock:
+        self._running.remove(job)
+        self._finished.append(job)
+      sublime.set_timeout(partial(self._on_job_finished, job))
+
+  def _run_job(self, job):
+    with timings.span(get_process_timing_name(job.command)):
+      try:
+        process = subprocess.Popen(job.command,
+                                   cwd=job.working_dir,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT,
+                                   startupinfo=get_startupinfo())
+      except OSError as ex:
+        job.output = str(ex)
+        job.state = ProcessJob.FAILED
+        return
+      with self._lock:
+        job.process = process
+        cancelled = job.state == ProcessJob.CANCELLED
+      if cancelled:
+        process.terminate()
+      output = process.communicate()[0]
+    job.output = str(output, 'utf-8', 'replace') if output else ''
+    job.returncode = process.returncode
+    job.process = None
+    with self._lock:
+      if job.state != ProcessJob.CANCELLED:
+        job.state = (ProcessJob.SUCCEEDED if process.returncode == 0
+                     else ProcessJob.FAILED)
+
+  def _on_job_finished(self, job):
+    if job.state == ProcessJob.FAILED:
+      print('IWillDo: %s failed with exit status %s.\n%s' % (
+          job.description, job.returncode, job.output))
+      sublime.status_message('IWillDo: %s failed with exit status %s.' % (
+          job.description, job.returncode))
+    self._show_progress()
+
+  def _show_progress(self):
+    """Updates the status bar. Called on the UI thread."""
+    with self._lock:
+      counts = collections.Counter(job.state for job in self._batch)
+      total = len(self._batch)
+      view = self._status_view
+    if not view:
+      return
+    done = total - counts[ProcessJob.QUEUED] - counts[ProcessJob.RUNNING]
+    text = 'IWillDo jobs: %d of %d done' % (done, total)
+    if counts[ProcessJob.RUNNING]:
+      text += ', %d running' % counts[ProcessJob.RUNNING]
+    if counts[ProcessJob.FAILED]:
+      text += ', %d failed' % counts[ProcessJob.FAILED]
+    if counts[ProcessJob.CANCELLED]:
+      text += ', %d cancelled' % counts[ProcessJob.CANCELLED]
+    if done < total:
+      view.set_status(self.STATUS_KEY, text)
+    else:
+      view.erase_status(self.STATUS_KEY)
+      sublime.status_message(text)
+
+
 class WillDoListShowCommand(sublime_plugin.TextCommand):
   def run(self, edit):
     # Not using self.view as it might be a console panel for example.
@@ -159,13 +1444,16 @@ class WillDoListShowCommand(sublime_plugin.TextCommand):
       return
 
     # Focus view if already created.
-    if iwilldolist.get_view():
-      self.view.window().focus_view(iwilldolist.get_view())
+    reporoot = view.settings().get(PREF_NAME_REPOROOT)
+    list_view = iwilldolists.get(reporoot).get_view()
+    if list_view:
+      list_view.window().focus_view(list_view)
       return
 
     # Possibly there is inactive view somewhere. Revive it.
     for v in view.window().views():
-      if v.settings().has('is_will_do_list_view'):
+      if (v.settings().has('is_will_do_list_view') and
+          v.settings().get(PREF_NAME_REPOROOT) == reporoot):
         self.view.window().focus_view(v)
         # Focusing takes care of starting the update interval.
         return
@@ -184,6 +1472,8 @@ class WillDoListShowCommand(sublime_plugin.TextCommand):
 
 class WillDoListStartUpdateIntervalCommand(sublime_plugin.TextCommand):
   def run(self, edit):
+    iwilldolist = iwilldolists.get(
+        self.view.settings().get(PREF_NAME_REPOROOT))
     if iwilldolist.initialize(self.view):
       iwilldolist.trigger_update(repeating=True)
 
@@ -194,39 +1484,132 @@ class WillDoListUpdateWithDataCommand(sublime_plugin.TextCommand):
   def __init__(self, *args, **kwargs):
     super().__init__(*args, **kwargs)
     self._output = []
+    # Keys identifying the output lines between renders.
+    self._output_keys = []
     self._current_line = 0
+    # Text offset where the next line starts.
+    self._current_offset = 0
+    # Regions of the text that mention the current user.
+    self._username_regions = []
     self._last_viewport_position = (0.0, 0.0)
+    # Lines currently shown in the view, their keys and the size of the view
+    # after the last render. Used to patch only the lines that changed.
+    self._rendered_lines = None
+    self._rendered_keys = None
+    self._rendered_size = 0
 
   def _reset_line_data(self):
     self._current_line = 0
+    self._current_offset = 0
+    self._username_regions = []
     self._output = []
-
-  def _add_line(self, text):
-    self._output.append(text)
+    self._output_keys = []
+
+  def _add_line(self, text, username_spans=(), key=None):
+    """Adds a line. username_spans are (start, end) offsets within the text
+    that should be highlighted as the current user. key identifies the line
+    between renders, lines without one are identified by their number."""
+    for start, end in username_spans:
+      self._username_regions.append(sublime.Region(
+          self._current_offset + start, self._current_offset + end))
+    lines = text.split('\n')
+    self._output.extend(lines)
+    self._output_keys.extend(
+        key if key is not None and index == 0
+        else ('line', self._current_line + index)
+        for index in range(len(lines)))
+    self._current_line += len(lines)
     # +1 as the lines will be joined later.
-    self._current_line += text.count('\n') + 1
+    self._current_offset += len(text) + 1
+
+  def _get_output_lines(self):
+    """Returns the lines and their keys."""
+    lines = self._output
+    keys = self._output_keys
+    # Every line is terminated with a newline when written to the view.
+    if lines and not lines[-1]:
+      lines = lines[:-1]
+      keys = keys[:-1]
+    return lines, keys
+
+  def _replace_all(self, edit, lines):
+    view = self.view
+    self._last_viewport_position = view.viewport_position()
+    view.replace(edit, sublime.Region(0, view.size()),
+                 ''.join(line + '\n' for line in lines))
+    # Viewport might scroll horizontally after replacing the content. Restore it
+    # to the previous position. Need to do it from the timeout as it's not
+    # updated synchronously.
+    sublime.set_timeout(self._restore_viewport_scroll, 0)
+
+  def _write_lines(self, edit, lines, keys):
+    """Writes lines to the view, replacing only the ones that changed since the
+    last render.
 
-  def _get_output(self):
-    return '\n'.join(self._output)
+    Returns a set of numbers of the lines whose regions might have been
+    displaced, or None if the whole buffer was replaced.
+    """
+    view = self.view
+    old_lines = self._rendered_lines
+    edited_lines = None
+    edits = None
+    if old_lines is not None and view.size() == self._rendered_size:
+      edits = compute_line_edits(old_lines, self._rendered_keys, lines, keys,
+                                 MAX_INCREMENTAL_EDITS)
+    if edits is None:
+      self._replace_all(edit, lines)
+    else:
+      edited_lines = set()
+      delta = 0
+      for start, end, new_lines in edits:
+        # Lines after the edit are included as regions starting right where
+        # the edit ends might have been moved too.
+        edited_lines.update(range(start + delta,
+                                  start + delta + len(new_lines) + 1))
+        delta += len(new_lines) - (end - start)
+      # Apply from the bottom so that earlier line offsets remain valid.
+      for start, end, new_lines in reversed(edits):
+        region_start = (view.text_point(start, 0) if start < len(old_lines)
+                        else view.size())
+        region_end = (view.text_point(end, 0) if end < len(old_lines)
+                      else view.size())
+        view.replace(edit, sublime.Region(region_start, region_end),
+                     ''.join(line + '\n' for line in new_lines))
+    self._rendered_lines = lines
+    self._rendered_keys = keys
+    self._rendered_size = view.size()
+    return edited_lines
 
   def _restore_viewport_scroll(self):
     if self.view.viewport_position()[0] > self._last_viewport_position[0]:
       self.view.set_viewport_position(self._last_viewport_position, False)
 
-  def run(self, edit, data):
+  def run(self, edit):
+    with timings.span('render') as details:
+      details['lines'] = self._render(edit)
+
+  def _render(self, edit):
+    """Renders the list and returns the number of lines."""
     view = self.view
+    iwilldolist = iwilldolists.get_for_view(view)
+    model = iwilldolist.get_list_model()
     self._reset_line_data()
     line_to_item_mapping = {}
-    line_to_owners_mapping = {}
     initial_cursor_pos = 0
-    if 'error' in data:
-      self._add_line(data['error'])
+    if model.error:
+      self._add_line(model.error)
     else:
-      name = '%s: %s' % (data['bts_issue'], data['title'])
+      name = '%s: %s' % (model.bts_issue, model.title)
       view.set_name(name)
       self._add_line(name)
-      self._add_line('Clean upstream: %s' % data['base_commit'])
-      self._add_line('Last updated: %s' % strftime("%d %b %H:%M:%S", gmtime()))
+      self._add_line('Clean upstream: %s' % model.base_commit)
+      status = ''
+      if model.stale:
+        status = ' (stale, refreshing...)'
+      elif model.partial:
+        status = ' (loading...)'
+      self._add_line('Last updated: %s%s' % (
+          strftime("%d %b %H:%M:%S", gmtime(model.updated_at)), status))
       self._add_line('')
       self._add_line('Used merge tool: %s (set "%s" pref if you want to change\n'
                      '                 to one of the other supported tools: '
@@ -237,30 +1620,57 @@ class WillDoListUpdateWithDataCommand(sublime_plugin.TextCommand):
       for command in COMMANDS:
         self._add_line('  %s - %s' % (command[0], command[1]))
       self._add_line('')
-      initial_cursor_pos = len(self._get_output())
-      for group in data['groups']:
-        self._add_line('%s' % group['title'])
-        for item in group['items']:
-          current_line = self._current_line
-          owners = [owner.strip() for owner in group['title'].split(',')]
-          line_to_owners_mapping[current_line] = owners
-          line_to_item_mapping[current_line] = item
-          self._add_line('  %s [%s] %s' % ('√' if item['closed'] else ' ',
-                                           item['claimed_by'],
-                                           item['name']))
+      visible_ids = iwilldolist.get_visible_item_ids(model)
+      if visible_ids is not None:
+        self._add_line('Showing: %s (%d of %d files)' % (
+            iwilldolist.get_list_filter().get_description(),
+            len(visible_ids),
+            model.get_index().get_item_count()))
         self._add_line('')
-      iwilldolist.set_line_to_item_mapping(line_to_item_mapping)
-      iwilldolist.set_line_to_owners_mapping(line_to_owners_mapping)
-      iwilldolist.set_upstream_sha(data['base_commit'])
-
+      initial_cursor_pos = self._current_offset
+      usermail = iwilldolist.get_usermail()
+      username = iwilldolist.get_username()
+      # Column at which claimed_by starts in the item line.
+      claimed_by_column = len('  √ [')
+      # Number of groups rendered so far with the given title.
+      title_counts = collections.Counter()
+      for group in model.groups:
+        items = group.items
+        if visible_ids is not None:
+          items = [item for item in items if item.id in visible_ids]
+        title = group.title
+        if len(items) < len(group.items):
+          title += ' (%d files hidden)' % (len(group.items) - len(items))
+        group_key = (group.title, title_counts[group.title])
+        title_counts[group.title] += 1
+        self._add_line(title, find_word_spans(group.title, usermail, ','),
+                       key=('group',) + group_key)
+        # Groups without any shown files take a single line.
+        if not items:
+          continue
+        for item in items:
+          line_to_item_mapping[self._current_line] = item
+          self._add_line('  %s [%s] %s' % ('√' if item.closed else ' ',
+                                           item.claimed_by,
+                                           item.name),
+                         [(claimed_by_column + start, claimed_by_column + end)
+                          for start, end in find_word_spans(
+                              item.claimed_by, username, ' ')],
+                         key=('item', item.id))
+        self._add_line('', key=('group end',) + group_key)
+      iwilldolist.set_upstream_sha(model.base_commit)
+    iwilldolist.set_line_to_item_mapping(line_to_item_mapping)
+
+    lines, keys = self._get_output_lines()
     view.set_read_only(False)
-    self._last_viewport_position = view.viewport_position()
-    view.replace(edit, sublime.Region(0, view.size()), self._get_output())
-    # Viewport might scroll horizontally after replacing the content. Restore it
-    # to the previous position. Need to do it from the timeout as it's not
-    # updated synchronously.
-    sublime.set_timeout(self._restore_viewport_scroll, 0)
+    edited_lines = self._write_lines(edit, lines, keys)
     view.set_read_only(True)
+    iwilldolist.set_line_index(IWillDoList.LineIndex(
+        lines, sorted(line_to_item_mapping), edited_lines))
+    # Fix up the marks of the edited lines right away, using the copied info
+    # that is already known. It's only read once the whole list is fetched.
+    if not model.partial:
+      view.run_command('will_do_list_update_gutter_marks')
 
     if not view.is_scratch():
       view.set_scratch(True)
@@ -269,56 +1679,131 @@ class WillDoListUpdateWithDataCommand(sublime_plugin.TextCommand):
       selection.clear()
       selection.add(sublime.Region(initial_cursor_pos, initial_cursor_pos))
 
-    # Highlight current user's mail.
-    regions = view.find_all('\\b%s' % iwilldolist.get_usermail())
+    # Highlight current user's mail and claims.
     view.add_regions('username_regions',
-                     regions,
+                     self._username_regions,
                      scope='whatever',
                      flags=sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE |
                          sublime.DRAW_SOLID_UNDERLINE)
+    return len(lines)
 
 
 class WillDoListUpdateGutterMarksCommand(sublime_plugin.TextCommand):
-  """Adds gutter icons based on last-synchronized tag of the item."""
+  """Adds gutter icons based on last-synchronized tag of the item.
+
+  Only the region sets containing items whose status changed, or whose lines
+  were rewritten by the last render, are replaced.
+  """
+
+  # Region key and icon of each of the item statuses.
+  STATUS_REGIONS = [
+      ('files_processed', 'circle-green'),
+      ('files_unprocessed', 'circle-gray'),
+      ('files_invalid', 'circle-red'),
+  ]
+  STATUS_PROCESSED = 0
+  STATUS_UNPROCESSED = 1
+  STATUS_INVALID = 2
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    # Line index the regions were last updated for.
+    self._line_index = None
+    # Mapping from item id to a (status, line) tuple as of the last update.
+    self._item_statuses = {}
+
+  def _get_status(self, iwilldolist, item):
+    copied = iwilldolist.get_copied_info_for_item(item)
+    if not copied:
+      return self.STATUS_INVALID
+    if copied['last_synchronized'] == iwilldolist.get_upstream_sha():
+      return self.STATUS_PROCESSED
+    return self.STATUS_UNPROCESSED
 
   def run(self, edit):
+    with timings.span('gutter marks') as details:
+      details['changed_statuses'] = self._update_marks()
+
+  def _update_marks(self):
+    """Updates the region sets and returns the number of changed ones."""
     view = self.view
-    regions_processed = []
-    regions_unprocessed = []
-    regions_invalid = []
-    lines_regions = view.lines(sublime.Region(0, view.size()))
+    iwilldolist = iwilldolists.get_for_view(view)
+    line_index = iwilldolist.get_line_index()
     line_to_item_mapping = iwilldolist.get_line_to_item_mapping()
-    for line in line_to_item_mapping:
-      copied = iwilldolist.get_copied_info_for_item(line_to_item_mapping[line])
-      if not copied:
-        regions_invalid.append(lines_regions[line])
-      elif copied['last_synchronized'] == iwilldolist.get_upstream_sha():
-        regions_processed.append(lines_regions[line])
-      else:
-        regions_unprocessed.append(lines_regions[line])
+    is_new_render = line_index is not self._line_index
+    item_statuses = {}
+    status_lines = [[] for _ in self.STATUS_REGIONS]
+    changed_statuses = set()
+    for line in line_index.get_item_lines():
+      item = line_to_item_mapping[line]
+      status = self._get_status(iwilldolist, item)
+      item_statuses[item.id] = (status, line)
+      status_lines[status].append(line)
+      previous = self._item_statuses.pop(item.id, None)
+      if previous is None or previous[0] != status:
+        changed_statuses.add(status)
+        if previous is not None:
+          changed_statuses.add(previous[0])
+      elif is_new_render and line_index.is_edited_line(line):
+        changed_statuses.add(status)
+    # Items that are gone.
+    for status, line in self._item_statuses.values():
+      changed_statuses.add(status)
+    self._item_statuses = item_statuses
+    self._line_index = line_index
+
     # TODO(rchlodnicki): There is a bug with rendering gutter icons with scope
     # tinting applied so I'm using own graphics right now. Otherwise I could
     # use built-in with scopes like comment, markup.inserted, markup.deleted.
     # http://www.sublimetext.com/forum/viewtopic.php?f=2&t=16214
-    view.add_regions('files_processed',
-                     regions_processed,
-                     scope='whatever',
-                     icon='%s/images/circle-green.png' % PACKAGE_PATH,
-                     flags=sublime.HIDDEN)
-    view.add_regions('files_unprocessed',
-                     regions_unprocessed,
-                     scope='whatever',
-                     icon='%s/images/circle-gray.png' % PACKAGE_PATH,
-                     flags=sublime.HIDDEN)
-    view.add_regions('files_invalid',
-                     regions_invalid,
-                     scope='whatever',
-                     icon='%s/images/circle-red.png' % PACKAGE_PATH,
-                     flags=sublime.HIDDEN)
+    for status in changed_statuses:
+      key, icon = self.STATUS_REGIONS[status]
+      view.add_regions(key,
+                       [line_index.get_line_region(line)
+                        for line in status_lines[status]],
+                       scope='whatever',
+                       icon='%s/images/%s.png' % (PACKAGE_PATH, icon),
+                       flags=sublime.HIDDEN)
+    return len(changed_statuses)
+
+
+class WillDoListFilterCommand(sublime_plugin.TextCommand):
+  """Switches between showing all files and only some of them."""
+
+  def run(self, edit):
+    iwilldolist = iwilldolists.get_for_view(self.view)
+    index = iwilldolist.get_list_model().get_index()
+    self._filters = [
+        ListFilter(),
+        ListFilter(ListFilter.MINE),
+        ListFilter(ListFilter.UNHANDLED),
+    ] + [ListFilter(ListFilter.CLAIMED_BY, username)
+         for username in index.get_claimers()]
+    self.view.window().show_quick_panel(
+        [list_filter.get_description() for list_filter in self._filters] +
+        ['Files with the path containing...'],
+        self._on_done)
+
+  def _on_done(self, index):
+    if index < 0:
+      return
+    iwilldolist = iwilldolists.get_for_view(self.view)
+    if index < len(self._filters):
+      iwilldolist.set_list_filter(self._filters[index])
+      return
+    current_filter = iwilldolist.get_list_filter()
+    self.view.window().show_input_panel(
+        'Path contains:',
+        (current_filter.argument
+         if current_filter.mode == ListFilter.PATH else ''),
+        lambda text: iwilldolist.set_list_filter(
+            ListFilter(ListFilter.PATH, text) if text else ListFilter()),
+        None, None)
 
 
 class WillDoListItemToggleClaimCommand(sublime_plugin.TextCommand):
   def _toggle_username_in(self, text):
+    iwilldolist = iwilldolists.get_for_view(self.view)
     current_user = iwilldolist.get_username()
     users = [] if not text else text.split(' ')
     if current_user in users:
@@ -327,29 +1812,31 @@ class WillDoListItemToggleClaimCommand(sublime_plugin.TextCommand):
       users.append(current_user)
     return ' '.join(users)
 
-  def _on_claim_updated(self, data):
-    iwilldolist.trigger_update()
-
   def run(self, edit):
+    iwilldolist = iwilldolists.get_for_view(self.view)
     for item in iwilldolist.get_items_for_selection(self.view):
-      new_claimed_by = self._toggle_username_in(item['claimed_by'])
+      new_claimed_by = self._toggle_username_in(item.claimed_by)
       iwilldolist.make_request(
-          API_UPDATE_ITEM_URL % item['id'],
+          iwilldolist.get_api_url(API_UPDATE_ITEM_PATH % item.id),
           'PATCH',
-          bytearray('{"claimed_by": "%s"}' % new_claimed_by, 'utf-8'),
-          self._on_claim_updated)
+          {'claimed_by': new_claimed_by})
+    # Requests are executed in order so a single refresh queued after all the
+    # claims picks up all of them.
+    iwilldolist.trigger_update()
 
 
 class WillDoListItemOpenCommand(sublime_plugin.TextCommand):
   def run(self, edit):
     view = self.view
+    iwilldolist = iwilldolists.get_for_view(view)
     for item in iwilldolist.get_items_for_selection(view):
-      view.window().open_file(get_item_path(item))
+      view.window().open_file(item.path)
 
 
 class WillDoListItemOpenUpstreamCommand(sublime_plugin.TextCommand):
   def is_enabled(self):
     view = self.view
+    iwilldolist = iwilldolists.get_for_view(view)
     is_enabled = False
     for item in iwilldolist.get_items_for_selection(view):
       info = iwilldolist.get_copied_info_for_item(item)
@@ -358,18 +1845,40 @@ class WillDoListItemOpenUpstreamCommand(sublime_plugin.TextCommand):
         break
     return is_enabled
 
+  def _on_upstream_files_read(self, files):
+    iwilldolist = iwilldolists.get_for_view(self.view)
+    window = self.view.window()
+    for info, content in files:
+      path = transform_path_absolute(info['copied_from_path'],
+                                     iwilldolist.get_reporoot())
+      if content is None:
+        # Not in the upstream commit, fall back to the checked out file.
+        window.open_file(path)
+        continue
+      new_view = window.new_file()
+      new_view.set_name('%s @ %s' % (os.path.basename(path),
+                                     iwilldolist.get_upstream_sha()[:12]))
+      new_view.run_command('write_upstream_file_to_view', {
+          'content': content.decode('utf-8', 'replace'),
+          'path': path
+      })
+
   def run(self, edit):
     view = self.view
+    iwilldolist = iwilldolists.get_for_view(view)
+    infos = []
     for item in iwilldolist.get_items_for_selection(view):
       info = iwilldolist.get_copied_info_for_item(item)
       if info:
-        view.window().open_file(
-            transform_path_absolute(info['copied_from_path']))
+        infos.append(info)
+    if infos:
+      iwilldolist.read_upstream_files(infos, self._on_upstream_files_read)
 
 
 class WillDoListItemMergeCommand(sublime_plugin.TextCommand):
   def run(self, edit):
     view = self.view
+    iwilldolist = iwilldolists.get_for_view(view)
     for item in iwilldolist.get_items_for_selection(view):
       copied_info = iwilldolist.get_copied_info_for_item(item)
       if copied_info:
@@ -378,47 +1887,40 @@ class WillDoListItemMergeCommand(sublime_plugin.TextCommand):
                        # built-in python and system installed one.
             'chromium_intake.py',
             '--end-commit', iwilldolist.get_upstream_sha(),
-            '--dest', get_item_path(item),
+            '--dest', item.path,
             '--mergetool=%s' % iwilldolist.get_mergetool(),
             '--tempdir', tempfile.gettempdir()
         ]
-        run_process(
+        submit_process_job(
+            view,
+            'Merge of %s' % item.name,
             command,
-            os.path.join(iwilldolist.get_reporoot(), 'desktop', 'tools'),
-            dont_block=True)
+            os.path.join(iwilldolist.get_reporoot(), 'desktop', 'tools'))
 
 
 class WillDoListItemDiffCommand(sublime_plugin.TextCommand):
+  def _on_diff_ready(self, command, output):
+    new_view = self.view.window().new_file()
+    new_view.set_name(' '.join(command))
+    new_view.run_command("write_git_diff_to_view", {"content": output})
+
   def run(self, edit):
     view = self.view
+    iwilldolist = iwilldolists.get_for_view(view)
     for item in iwilldolist.get_items_for_selection(view):
       copied_info = iwilldolist.get_copied_info_for_item(item)
       if copied_info:
-        command = ['git',
-                   'diff',
-                   '%s..%s' % (copied_info['last_synchronized'],
-                               iwilldolist.get_upstream_sha()),
-                   '--exit-code',
-                   '--',
-                   transform_path_absolute(copied_info['copied_from_path'])]
-        chromium_src = normalize_path(
-            os.path.join(iwilldolist.get_reporoot(), 'chromium', 'src'))
-        (output, returncode) = run_process(command, chromium_src)
-        if returncode != 1:
-          output = 'No changes'
-        new_view = view.window().new_file()
-        new_view.set_name(' '.join(command))
-        new_view.run_command("write_git_diff_to_view", {"content": output})
+        iwilldolist.get_upstream_diff(copied_info, self._on_diff_ready)
 
 
 class WillDoListItemUpdateShaCommand(sublime_plugin.TextCommand):
   def run(self, edit):
     view = self.view
-    for item in iwilldolist.get_items_for_selection(view):
-      copied_info = iwilldolist.get_copied_info_for_item(item)
-      if copied_info:
-        copied_info.set_last_sync(iwilldolist.get_upstream_sha())
-    iwilldolist.trigger_update()
+    iwilldolist = iwilldolists.get_for_view(view)
+    # The list itself doesn't change, only the local files do, so there is
+    # no need to fetch it.
+    iwilldolist.set_items_synchronized(
+        iwilldolist.get_items_for_selection(view))
 
 
 class WillDoListItemGitLogCommand(sublime_plugin.TextCommand):
@@ -426,67 +1928,106 @@ class WillDoListItemGitLogCommand(sublime_plugin.TextCommand):
     super().__init__(*args, **kwargs)
     self._items_shas = []
     self._file_path = ''
+    self._page = 0
+    self._has_more = False
 
-  def on_item_selected(self, index):
-    if index == -1:
-      return
+  def _on_show_ready(self, command, output):
     new_view = self.view.window().new_file()
-    sha = self._items_shas[index]
-    command = ['git', 'show', sha, '--exit-code', '--', self._file_path]
-    (output, returncode) = run_process(command, iwilldolist.get_reporoot())
     new_view.set_name(' '.join(command))
     new_view.set_scratch(True)
     new_view.run_command("write_git_diff_to_view", {"content": output})
 
-  def run(self, edit):
+  def on_item_selected(self, index):
+    iwilldolist = iwilldolists.get_for_view(self.view)
+    if index == -1:
+      return
+    if index < len(self._items_shas):
+      iwilldolist.get_git_show(
+          self._items_shas[index], self._file_path, self._on_show_ready)
+    elif self._has_more:
+      self._page += 1
+      iwilldolist.get_git_log(self._file_path, self._page, self._on_log_ready)
+
+  def _on_log_ready(self, entries, has_more):
+    first_new_index = len(self._items_shas)
     self._items_shas = []
+    self._has_more = has_more
+    commands = []
+    for sha, date, author, summary in entries:
+      commands.append(['%s <%s>' % (summary, author), '%s %s' % (date, sha)])
+      self._items_shas.append(sha)
+    if has_more:
+      commands.append(['Load more...',
+                       '%d commits shown so far' % len(entries)])
+    if not commands:
+      commands.append('No changes')
+    self.view.window().show_quick_panel(
+        commands, self.on_item_selected, 0,
+        min(first_new_index, len(commands) - 1))
+
+  def run(self, edit):
     view = self.view
+    iwilldolist = iwilldolists.get_for_view(view)
     for item in iwilldolist.get_items_for_selection(view):
-      copied_info = iwilldolist.get_copied_info_for_item(item)
-      command = ['git',
-                 'log',
-                 '--pretty=%H;(%ar) %ad;%aE;%s',
-                 '--date=local',
-                 '--max-count=9000',
-                 '--exit-code',
-                 '--',
-                 get_item_path(item)]
-      (output, returncode) = run_process(command, iwilldolist.get_reporoot())
-      commands = []
-      if returncode == 1:
-        self._file_path = get_item_path(item)
-        for line in output.split('\n'):
-          if line.strip():
-            sha, date, author, summary = line.split(';')
-            commands.append(['%s <%s>' % (summary, author),
-                             '%s %s' % (date, sha)])
-            self._items_shas.append(sha)
-      else:
-        commands.append('No changes')
-
-      view.window().show_quick_panel(commands, self.on_item_selected)
+      self._items_shas = []
+      self._file_path = item.path
+      self._page = 0
+      iwilldolist.get_git_log(self._file_path, self._page, self._on_log_ready)
       # Can only handle one item.
       return
 
 
 class WillDoListGoToNext(sublime_plugin.TextCommand):
   def run(self, edit):
-    line_start = self.view.full_line(self.view.sel()[0]).a
-    line_regions = self.view.lines(sublime.Region(0, line_start))
-    iwilldolist.scroll_to_next_unhandled_item_after_line(len(line_regions) + 1)
+    iwilldolist = iwilldolists.get_for_view(self.view)
+    line = iwilldolist.get_line_index().get_line_at(self.view.sel()[0].begin())
+    iwilldolist.scroll_to_next_unhandled_item_after_line(line + 1)
 
 
 class WillDoListItemCompareCommand(sublime_plugin.TextCommand):
+  def _on_upstream_files_read(self, items, files):
+    iwilldolist = iwilldolists.get_for_view(self.view)
+    upstream_dir = os.path.join(tempfile.gettempdir(), 'IntakeToolkit',
+                                iwilldolist.get_upstream_sha())
+    for item, (info, content) in zip(items, files):
+      upstream_path = transform_path_absolute(info['copied_from_path'],
+                                              iwilldolist.get_reporoot())
+      if content is not None:
+        # Compare with the file at the upstream commit rather than with
+        # whatever is checked out.
+        upstream_path = os.path.join(
+            upstream_dir,
+            upstream_path[len(iwilldolist.get_reporoot()) + 1:])
+        os.makedirs(os.path.dirname(upstream_path), exist_ok=True)
+        with open(upstream_path, 'wb') as upstream_file:
+          upstream_file.write(content)
+      submit_process_job(self.view,
+                         'Comparison of %s' % item.name,
+                         [iwilldolist.get_mergetool(),
+                          item.path,
+                          upstream_path],
+                         iwilldolist.get_reporoot())
+
   def run(self, edit):
     view = self.view
+    iwilldolist = iwilldolists.get_for_view(view)
+    items = []
+    infos = []
     for item in iwilldolist.get_items_for_selection(view):
       copied_info = iwilldolist.get_copied_info_for_item(item)
       if copied_info:
-        run_process([iwilldolist.get_mergetool(),
-                     get_item_path(item),
-                     transform_path_absolute(copied_info['copied_from_path'])],
-                    iwilldolist.get_reporoot(),
-                    dont_block=True)
+        items.append(item)
+        infos.append(copied_info)
+    if infos:
+      iwilldolist.read_upstream_files(
+          infos, partial(self._on_upstream_files_read, items))
+
+
+class WillDoListCancelJobsCommand(sublime_plugin.TextCommand):
+  def run(self, edit):
+    count = process_runner.cancel()
+    sublime.status_message(
+        'IWillDo: cancelled %d merges and comparisons.' % count)
 
 
 class WriteGitDiffToViewCommand(sublime_plugin.TextCommand):
@@ -502,6 +2043,22 @@ class WriteGitDiffToViewCommand(sublime_plugin.TextCommand):
     selection.add(sublime.Region(0, 0))
 
 
+class WriteUpstreamFileToViewCommand(sublime_plugin.TextCommand):
+  def run(self, edit, content, path):
+    view = self.view
+    view.insert(edit, 0, content)
+    view.set_scratch(True)
+    view.set_read_only(True)
+    # Not available in older versions of Sublime.
+    if hasattr(sublime, 'find_syntax_for_file'):
+      syntax = sublime.find_syntax_for_file(path)
+      if syntax:
+        view.assign_syntax(syntax)
+    selection = view.sel()
+    selection.clear()
+    selection.add(sublime.Region(0, 0))
+
+
 class WillDoListItemShowPanelCommand(sublime_plugin.TextCommand):
   def __init__(self, *args, **kwargs):
     super().__init__(*args, **kwargs)
@@ -523,104 +2080,944 @@ class WillDoListItemShowPanelCommand(sublime_plugin.TextCommand):
     self.view.window().show_quick_panel(self._command_names, self._on_done)
 
 
+class WillDoListShowTimingsCommand(sublime_plugin.WindowCommand):
+  """Shows durations of the recent operations in an output panel."""
+
+  PANEL_NAME = 'will_do_list_timings'
+
+  def _format_stats(self, name, count, stats):
+    return '%-32s %6d %9.1f %9.1f %9.1f %9.1f %9.1f' % (
+        name, count, stats['mean_ms'], stats['p50_ms'], stats['p90_ms'],
+        stats['p99_ms'], stats['max_ms'])
+
+  def run(self):
+    lines = ['%-32s %6s %9s %9s %9s %9s %9s' % (
+        'Operation', 'Count', 'Mean ms', 'P50 ms', 'P90 ms', 'P99 ms',
+        'Max ms')]
+    for name, count, stats in timings.get_stats():
+      lines.append(self._format_stats(name, count, stats))
+    http_stats = http_client.get_latency_stats()
+    if 'mean_ms' in http_stats:
+      lines.append(self._format_stats(
+          'http client', http_stats['requests'], http_stats))
+    lines.append('')
+    lines.append('HTTP requests: %d, reused connections: %d' % (
+        http_stats['requests'], http_stats['reused_connections']))
+    panel = self.window.create_output_panel(self.PANEL_NAME)
+    panel.run_command('append', {'characters': '\n'.join(lines) + '\n'})
+    self.window.run_command('show_panel',
+                            {'panel': 'output.%s' % self.PANEL_NAME})
+
+
+class WillDoListShowJobsCommand(sublime_plugin.WindowCommand):
+  """Shows the recent merges and comparisons in an output panel."""
+
+  PANEL_NAME = 'will_do_list_jobs'
+
+  def run(self):
+    lines = []
+    for job in process_runner.get_jobs():
+      state = job.state
+      if job.returncode is not None:
+        state += ' (exit status %d)' % job.returncode
+      lines.append('%-24s %s' % (state, job.description))
+      if job.state == ProcessJob.FAILED and job.output:
+        lines.extend('    ' + line for line in job.output.splitlines())
+    if not lines:
+      lines.append('No merges or comparisons were run.')
+    panel = self.window.create_output_panel(self.PANEL_NAME)
+    panel.run_command('append', {'characters': '\n'.join(lines) + '\n'})
+    self.window.run_command('show_panel',
+                            {'panel': 'output.%s' % self.PANEL_NAME})
+
+
 class EventObserver(sublime_plugin.EventListener):
   def on_activated(self, view):
     # Reuse existing IWillDo view.
-    if (view.settings().has('is_will_do_list_view')
-            and iwilldolist.get_view() is None):
-      view.run_command('will_do_list_start_update_interval')
+    if view.settings().has('is_will_do_list_view'):
+      iwilldolist = iwilldolists.get_for_view(view)
+      if not iwilldolist or iwilldolist.get_view() is None:
+        view.run_command('will_do_list_start_update_interval')
+    # Activating any view might hide or reveal the list views.
+    sublime.set_timeout(iwilldolists.update_view_visibility, 0)
+
+  def on_deactivated(self, view):
+    if view.settings().has('is_will_do_list_view'):
+      sublime.set_timeout(iwilldolists.update_view_visibility, 0)
 
   def on_pre_close(self, view):
-    iwilldolist.on_view_closing(view)
+    iwilldolists.on_view_closing(view)
 
 
 class IWillDoList(object):
-  """Global class that controls the plugin."""
-
-  class NetworkWorkerThread(threading.Thread):
-    def __init__(self, url, method, data, auth_token, callback, repeating):
-      super(IWillDoList.NetworkWorkerThread, self).__init__()
+  """Controls the IWillDo list of a single repo root."""
+
+  class ListValidators(object):
+    """Cache validators and content hash of the last list payload delivered to
+    the view. Shared by all threads fetching the list so that a payload which
+    is already shown is neither re-rendered nor re-scanned."""
+
+    def __init__(self):
+      self._lock = threading.Lock()
+      self._etag = None
+      self._last_modified = None
+      self._digest = None
+
+    def reset(self):
+      with self._lock:
+        self._etag = None
+        self._last_modified = None
+        self._digest = None
+
+    def get_request_headers(self):
+      headers = {}
+      with self._lock:
+        if self._etag:
+          headers['If-None-Match'] = self._etag
+        if self._last_modified:
+          headers['If-Modified-Since'] = self._last_modified
+      return headers
+
+    def update(self, response_headers, digest):
+      """Stores validators of a fetched payload.
+
+      Returns True if the payload differs from the previously delivered one.
+      """
+      with self._lock:
+        self._etag = response_headers.get('ETag')
+        self._last_modified = response_headers.get('Last-Modified')
+        changed = digest != self._digest
+        self._digest = digest
+      return changed
+
+  class LineIndex(object):
+    """Index of the rendered list, built once per render.
+
+    Line lookups by text offset and item lookups by line are binary searches
+    over sorted arrays, so they don't need to split the buffer into lines.
+    """
+
+    def __init__(self, lines=(), item_lines=(), edited_lines=None):
+      # Numbers of the lines that were edited by the render, None if all.
+      self._edited_lines = edited_lines
+      # Offset of the start of each line, followed by the size of the text.
+      self._line_offsets = [0]
+      offset = 0
+      for line in lines:
+        offset += len(line) + 1
+        self._line_offsets.append(offset)
+      # Sorted numbers of lines that show an item.
+      self._item_lines = list(item_lines)
+      # Sorted numbers of lines that show current user's unhandled items.
+      self._unhandled_lines = []
+
+    def get_line_at(self, offset):
+      """Returns number of the line containing the text offset."""
+      line = bisect.bisect_right(self._line_offsets, offset) - 1
+      return max(0, min(line, len(self._line_offsets) - 2))
+
+    def get_line_region(self, line):
+      """Returns region of the line, not including the newline."""
+      return sublime.Region(self._line_offsets[line],
+                            self._line_offsets[line + 1] - 1)
+
+    def get_item_lines_between(self, first_line, last_line):
+      """Returns item lines within the inclusive range of lines."""
+      return self._item_lines[
+          bisect.bisect_left(self._item_lines, first_line):
+          bisect.bisect_right(self._item_lines, last_line)]
+
+    def get_item_lines(self):
+      return self._item_lines
+
+    def is_edited_line(self, line):
+      return self._edited_lines is None or line in self._edited_lines
+
+    def set_unhandled_lines(self, lines):
+      self._unhandled_lines = lines
+
+    def get_unhandled_lines(self):
+      return self._unhandled_lines
+
+    def get_unhandled_lines_after(self, line, count):
+      """Returns up to count unhandled item lines at or after line, followed
+      by the ones from the beginning."""
+      index = bisect.bisect_left(self._unhandled_lines, line)
+      lines = self._unhandled_lines[index:index + count]
+      if len(lines) < count:
+        lines += self._unhandled_lines[:min(index, count - len(lines))]
+      return lines
+
+    def get_next_unhandled_line(self, line):
+      """Returns first unhandled item line at or after line, or None."""
+      index = bisect.bisect_left(self._unhandled_lines, line)
+      if index < len(self._unhandled_lines):
+        return self._unhandled_lines[index]
+      return None
+
+  class NetworkRequest(object):
+    """A request executed on the network queue.
+
+    Callbacks are called on the UI thread with the decoded response.
+    """
+
+    def __init__(self, url, method, fields, auth_token, callback=None,
+                 validators=None, force=False, status_callback=None,
+                 since=None, partial_callback=None):
       self._url = url
+      # Revision to fetch the changes since, or None to fetch everything.
+      self._since = since
       self._method = method
-      self._data = data
-      self._callback = callback
-      self._repeating = repeating
-      self._headers = {
+      # Dictionary of fields sent as a JSON body.
+      self._fields = fields
+      self._auth_token = auth_token
+      self._callbacks = [callback] if callback else []
+      # Called on the network thread with a bool telling whether the request
+      # succeeded.
+      self._status_callbacks = [status_callback] if status_callback else []
+      # When set, the list is decoded while it's downloaded and the groups
+      # received so far are passed to these callbacks on the UI thread.
+      self._partial_callbacks = [partial_callback] if partial_callback else []
+      # When set, the request is made conditional and unchanged payloads are
+      # not passed to the callbacks. Forced requests skip that check.
+      self._validators = validators
+      self._force = force
+
+    @staticmethod
+    def _merge_callbacks(pending_callbacks, callbacks):
+      return pending_callbacks + [callback for callback in callbacks
+                                  if callback not in pending_callbacks]
+
+    @staticmethod
+    def merge(pending, request):
+      """Merges a request into a pending one for the same URL."""
+      merge_callbacks = IWillDoList.NetworkRequest._merge_callbacks
+      if pending._fields is not None or request._fields is not None:
+        fields = dict(pending._fields or {})
+        fields.update(request._fields or {})
+        request._fields = fields
+      request._force = request._force or pending._force
+      if pending._since is None or request._force:
+        request._since = None
+      request._callbacks = merge_callbacks(
+          pending._callbacks, request._callbacks)
+      request._status_callbacks = merge_callbacks(
+          pending._status_callbacks, request._status_callbacks)
+      request._partial_callbacks = merge_callbacks(
+          pending._partial_callbacks, request._partial_callbacks)
+      return request
+
+    def _is_unchanged(self, digest, headers):
+      if not self._validators:
+        return False
+      return not self._validators.update(headers, digest) and not self._force
+
+    def __call__(self):
+      headers = {
           'Content-Type': 'application/json',
-          'Authorization': 'Token %s' % auth_token
+          'Authorization': 'Token %s' % self._auth_token
       }
-      self._stop_event = threading.Event()
-
-    def _fetch_url(self, url):
+      if self._validators and not self._force:
+        headers.update(self._validators.get_request_headers())
+      body = None
+      if self._fields is not None:
+        body = json.dumps(self._fields).encode('utf-8')
+      url = self._url
+      if self._since is not None:
+        url += '?' + urllib.parse.urlencode({'since': self._since})
+      reader = None
+      if self._partial_callbacks and self._since is None:
+        reader = IWillDoList.ProgressiveListReader(self._partial_callbacks)
+      error = None
+      data = None
       try:
-        data = urllib.request.urlopen(url).read().decode('utf-8')
-      except urllib.error.URLError as ex:
-        data = '{"error": "Failed retrieving data. %s"}' % ex.reason
+        with timings.span('network: %s' % self._method):
+          status, reason, response_headers, body = http_client.request(
+              self._method, url, body, headers, consumer=reader)
+        if status >= 400:
+          error = reason
+        elif status == 304:
+          pass
+        elif body is None:
+          # The body was decoded by the reader while it was downloaded.
+          if not self._is_unchanged(reader.get_digest(), response_headers):
+            data = reader.close()
+        elif not self._is_unchanged(hashlib.sha1(body).hexdigest(),
+                                    response_headers):
+          with timings.span('json decode', bytes=len(body)):
+            data = json.loads(body.decode('utf-8'))
+      except (OSError, http.client.HTTPException, ValueError) as ex:
+        # ValueError is raised for malformed or truncated payloads.
+        error = ex
+      for status_callback in self._status_callbacks:
+        status_callback(error is None)
+
+      if error is not None:
+        data = {'error': 'Failed retrieving data. %s' % error}
+      elif data is None:
+        return
+      if 'error' in data and self._validators:
+        # Make sure the list is rendered again once the server recovers.
+        self._validators.reset()
+      for callback in self._callbacks:
+        sublime.set_timeout(partial(callback, data))
+
+  class ProgressiveListReader(object):
+    """Decodes the list payload while it's being downloaded.
+
+    Groups decoded so far are passed to the callbacks on the UI thread as
+    soon as there are any, and then at exponentially growing intervals so
+    that the partial list is rendered only a few times.
+    """
+
+    def __init__(self, callbacks):
+      self._callbacks = callbacks
+      self._decoder = ListPayloadDecoder()
+      self._hash = hashlib.sha1()
+      self._size = 0
+      # Total time spent decoding, in seconds.
+      self._decode_time = 0
+      self._flushed_group_count = 0
+      self._flush_interval = PARTIAL_LIST_FLUSH_INTERVAL_SEC
+      self._next_flush_time = 0
+
+    def __call__(self, chunk):
+      start = monotonic()
+      self._hash.update(chunk)
+      self._size += len(chunk)
+      self._decoder.feed(chunk)
+      now = monotonic()
+      self._decode_time += now - start
+      group_count = self._decoder.get_group_count()
+      if (group_count > self._flushed_group_count and
+          now >= self._next_flush_time):
+        self._flushed_group_count = group_count
+        self._next_flush_time = now + self._flush_interval
+        self._flush_interval *= 2
+        data = self._decoder.get_data()
+        for callback in self._callbacks:
+          sublime.set_timeout(partial(callback, data))
+
+    def get_digest(self):
+      return self._hash.hexdigest()
+
+    def close(self):
+      """Returns the whole payload. Raises ValueError if it's invalid."""
+      start = monotonic()
+      data = self._decoder.close()
+      timings.record('json decode', self._decode_time + monotonic() - start,
+                     {'bytes': self._size, 'streamed': True})
       return data
 
+  class PollScheduler(threading.Thread):
+    """Queues periodic updates of the list until stopped.
+
+    Updates are queued often while the view is visible, rarely or not at all
+    while it's hidden, and exponentially less often while they are failing.
+    While push updates are connected the list is only polled as a fallback.
+    Stopping or requesting a refresh takes effect immediately.
+    """
+
+    def __init__(self, submit_update, interval, hidden_interval):
+      super(IWillDoList.PollScheduler, self).__init__()
+      self.daemon = True
+      self._submit_update = submit_update
+      self._interval = interval
+      self._hidden_interval = hidden_interval
+      self._lock = threading.Lock()
+      self._wake_event = threading.Event()
+      self._visible = True
+      self._push_connected = False
+      self._failures = 0
+      self._stopped = False
+      # None when no refresh was requested, otherwise whether it's forced.
+      self._requested_refresh = None
+      # Time of the last update, None to update right away.
+      self._last_update_time = None
+
+    def _get_interval(self):
+      """Returns the current update interval or None if updates are paused."""
+      interval = self._interval if self._visible else self._hidden_interval
+      if not interval:
+        return None
+      if self._push_connected:
+        interval = max(interval, PUSH_RESYNC_INTERVAL_SEC)
+      if self._failures:
+        backoff = min(self._interval * 2 ** self._failures,
+                      MAX_BACKOFF_INTERVAL_SEC)
+        interval = max(interval, backoff)
+      return interval
+
+    def set_visible(self, visible):
+      with self._lock:
+        self._visible = visible
+      self._wake_event.set()
+
+    def set_push_connected(self, connected):
+      with self._lock:
+        self._push_connected = connected
+      self._wake_event.set()
+
+    def report_status(self, succeeded):
+      """Called on the network thread after each update."""
+      with self._lock:
+        self._failures = 0 if succeeded else self._failures + 1
+      self._wake_event.set()
+
+    def refresh(self, force=False):
+      with self._lock:
+        self._requested_refresh = force or bool(self._requested_refresh)
+      self._wake_event.set()
+
     def stop(self):
-      self._stop_event.set()
+      with self._lock:
+        self._stopped = True
+      self._wake_event.set()
 
     def run(self):
       while True:
-        request = urllib.request.Request(self._url,
-                                         data=self._data,
-                                         headers=self._headers,
-                                         method=self._method)
-        data = json.loads(self._fetch_url(request))
-        sublime.set_timeout(partial(self._callback, data))
-        if self._repeating:
-          sleep(CHECK_INTERVAL_SEC)
-        if not self._repeating or self._stop_event.is_set():
-          break
+        self._wake_event.clear()
+        with self._lock:
+          if self._stopped:
+            return
+          force = self._requested_refresh
+          self._requested_refresh = None
+          interval = self._get_interval()
+        now = monotonic()
+        if (force is not None or self._last_update_time is None or
+            (interval is not None and
+             now - self._last_update_time >= interval)):
+          self._last_update_time = now
+          self._submit_update(bool(force))
+          continue
+        self._wake_event.wait(
+            None if interval is None
+            else self._last_update_time + interval - now)
+
+  class PushListener(threading.Thread):
+    """Listens to server-sent events announcing changes of the list.
+
+    on_change is called for every event and on_connected with whether the
+    connection is established. The listener reconnects with backoff when the
+    connection drops and gives up for good if the server doesn't support
+    push updates.
+    """
+
+    def __init__(self, url, auth_token, on_change, on_connected):
+      super(IWillDoList.PushListener, self).__init__()
+      self.daemon = True
+      self._url = url
+      self._auth_token = auth_token
+      self._on_change = on_change
+      self._on_connected = on_connected
+      self._lock = threading.Lock()
+      self._stop_event = threading.Event()
+      self._connection = None
+      # Socket of the connection. Kept apart because the connection drops it
+      # once it reads a response that closes the connection.
+      self._sock = None
+
+    def stop(self):
+      self._stop_event.set()
+      with self._lock:
+        sock = self._sock
+      # Interrupt the blocking read.
+      if sock:
+        try:
+          sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+          pass
+
+    def _connect(self):
+      parts = urllib.parse.urlsplit(self._url)
+      connection_class = (http.client.HTTPSConnection
+                          if parts.scheme == 'https'
+                          else http.client.HTTPConnection)
+      connection = connection_class(parts.netloc,
+                                    timeout=PUSH_READ_TIMEOUT_SEC)
+      with self._lock:
+        self._connection = connection
+      connection.connect()
+      with self._lock:
+        self._sock = connection.sock
+      # Stopped while connecting, before the socket could be shut down.
+      if self._stop_event.is_set():
+        raise OSError('Push listener stopped')
+      connection.request('GET', parts.path, headers={
+          'Accept': 'text/event-stream',
+          'Authorization': 'Token %s' % self._auth_token,
+      })
+      return connection.getresponse()
+
+    def _is_supported(self, response):
+      if response.status in (404, 405, 406, 501):
+        return False
+      content_type = response.getheader('Content-Type') or ''
+      return (response.status != 200 or
+              content_type.startswith('text/event-stream'))
+
+    def _read_events(self, response):
+      """Calls on_change for every event until the stream ends."""
+      has_data = False
+      while not self._stop_event.is_set():
+        line = response.readline()
+        if not line:
+          return
+        line = line.rstrip(b'\r\n')
+        if not line:
+          # Empty line dispatches the event.
+          if has_data:
+            self._on_change()
+          has_data = False
+        elif line.startswith(b'data:'):
+          has_data = True
+
+    def run(self):
+      failures = 0
+      while not self._stop_event.is_set():
+        response = None
+        try:
+          response = self._connect()
+          if not self._is_supported(response):
+            print('IWillDo: push updates not supported, polling instead.')
+            return
+          if response.status == 200:
+            failures = 0
+            self._on_connected(True)
+            self._read_events(response)
+        except (OSError, http.client.HTTPException):
+          pass
+        finally:
+          with self._lock:
+            connection = self._connection
+            self._connection = None
+            self._sock = None
+          if response:
+            response.close()
+          if connection:
+            connection.close()
+        if self._stop_event.is_set():
+          return
+        self._on_connected(False)
+        failures += 1
+        self._stop_event.wait(min(PUSH_RECONNECT_INTERVAL_SEC * 2 ** failures,
+                                  MAX_BACKOFF_INTERVAL_SEC))
+
+  class ListFeed(object):
+    """Keeps the lists fetched from the same API endpoint up to date.
+
+    A single scheduler, and push listener, run while any of the lists is
+    shown in a view and every fetched payload is passed to all of them. The
+    scheduler is set up with the prefs of the list that started it.
+    """
+
+    def __init__(self, url, events_url, auth_token):
+      self._url = url
+      self._events_url = events_url
+      self._auth_token = auth_token
+      # IWillDoList objects shown in a view.
+      self._lists = []
+      # Validators of the payload the lists were last updated with.
+      self._validators = IWillDoList.ListValidators()
+      # Time at which the whole list was last fetched.
+      self._last_full_sync_time = None
+      self._scheduler = None
+      self._push_listener = None
+
+    def add_list(self, iwilldolist):
+      """Starts updating the list, fetching the whole list right away."""
+      if iwilldolist not in self._lists:
+        self._lists.append(iwilldolist)
+      # The new list has to get the whole payload, even if it didn't change.
+      self._validators.reset()
+      self._last_full_sync_time = None
+      if self._scheduler:
+        self._scheduler.refresh()
+        return
+      check_interval, hidden_check_interval = (
+          iwilldolist.get_check_intervals())
+      self._scheduler = IWillDoList.PollScheduler(
+          self._submit_update, check_interval, hidden_check_interval)
+      self._scheduler.start()
+      if iwilldolist.get_push_updates():
+        self._push_listener = IWillDoList.PushListener(
+            self._events_url,
+            self._auth_token,
+            self._scheduler.refresh,
+            partial(self._on_push_connected, self._scheduler))
+        self._push_listener.start()
+
+    def remove_list(self, iwilldolist):
+      """Stops updating the list. Updates stop once there are no lists."""
+      if iwilldolist in self._lists:
+        self._lists.remove(iwilldolist)
+      if not self._lists:
+        self.stop()
+
+    def stop(self):
+      if self._push_listener:
+        self._push_listener.stop()
+        self._push_listener = None
+      if self._scheduler:
+        self._scheduler.stop()
+        self._scheduler = None
+
+    def trigger_update(self, force=False):
+      if self._scheduler:
+        # Also postpones the next periodic update.
+        self._scheduler.refresh(force)
+      else:
+        self._submit_update(force)
+
+    def request_full_sync(self):
+      """Fetches the whole list, e.g. when a delta doesn't apply."""
+      # The list on the server might be the one the delta was fetched for.
+      self._validators.reset()
+      self._last_full_sync_time = None
+      self.trigger_update()
+
+    def update_view_visibility(self):
+      """Tells the scheduler whether any of the lists is shown."""
+      if self._scheduler:
+        self._scheduler.set_visible(
+            any(iwilldolist.is_view_visible() for iwilldolist in self._lists))
+
+    @staticmethod
+    def _on_push_connected(scheduler, connected):
+      """Called on the push listener thread when its connection changes."""
+      scheduler.set_push_connected(connected)
+      if connected:
+        # Catch up with the changes made while disconnected.
+        scheduler.refresh()
+
+    def _submit_update(self, force=False):
+      """Queues a fetch of the list. Called on the scheduler thread too."""
+      lists = list(self._lists)
+      if not lists:
+        return
+      scheduler = self._scheduler
+      models = [iwilldolist.get_list_model() for iwilldolist in lists]
+      # Show the list while it's downloaded if some list has nothing to show.
+      partial_callback = None
+      if any(iwilldolist.is_waiting_for_list() for iwilldolist in lists):
+        partial_callback = self._on_partial_data_fetched
+      since = None
+      revisions = set(model.revision for model in models)
+      if (len(revisions) == 1 and None not in revisions and
+          not any(model.stale or model.error for model in models)):
+        last_full_sync_time = self._last_full_sync_time
+        if (last_full_sync_time is None or
+            monotonic() - last_full_sync_time >= FULL_SYNC_INTERVAL_SEC):
+          # Make sure changes that were missed are picked up. The list is
+          # only passed to the callbacks if it changed, so count the sync
+          # from now on.
+          self._last_full_sync_time = monotonic()
+        elif not force:
+          since = revisions.pop()
+      request = IWillDoList.NetworkRequest(
+          self._url,
+          'GET',
+          None,
+          self._auth_token,
+          self._on_data_fetched,
+          validators=self._validators,
+          force=force,
+          status_callback=scheduler.report_status if scheduler else None,
+          since=since,
+          partial_callback=partial_callback)
+      submit_request(('GET', self._url), request)
+
+    def _on_data_fetched(self, data):
+      if not data.get('delta') and not data.get('error'):
+        self._last_full_sync_time = monotonic()
+      for iwilldolist in list(self._lists):
+        iwilldolist.update_view_with_data(data)
+        iwilldolist.update_copied_info_data()
+
+    def _on_partial_data_fetched(self, data):
+      for iwilldolist in list(self._lists):
+        iwilldolist.show_partial_data(data)
+
+  class GitJob(object):
+    """A git command executed on the git queue.
+
+    The handler is called on the git thread with the output and the return
+    code of the command. What it returns is passed to the callbacks on the UI
+    thread.
+    """
+
+    def __init__(self, command, working_dir, handler, callback=None):
+      self._command = command
+      self._working_dir = working_dir
+      self._handler = handler
+      self._callbacks = [callback] if callback else []
+
+    @staticmethod
+    def merge(pending, job):
+      """Merges a job into a pending one running the same command."""
+      job._callbacks = pending._callbacks + [
+          callback for callback in job._callbacks
+          if callback not in pending._callbacks]
+      return job
+
+    def __call__(self):
+      output, returncode = run_process(self._command, self._working_dir)
+      result = self._handler(output, returncode)
+      for callback in self._callbacks:
+        sublime.set_timeout(partial(callback, result))
+
+  class CopiedInfoCache(object):
+    """Cache of CopiedFile objects keyed by path and validated against the
+    modification time and size of the file, so that only files that changed
+    since the previous scan are parsed again."""
+
+    def __init__(self, copied_file_class):
+      self._lock = threading.Lock()
+      self._copied_file_class = copied_file_class
+      # Mapping from path to a ((st_mtime_ns, st_size), CopiedFile) tuple.
+      self._entries = {}
+
+    def _parse_batch(self, batch, reporoot):
+      create = self._copied_file_class.create
+      return [(file_path, stat_key,
+               create(file_path, reporoot, allow_caching=False))
+              for file_path, stat_key in batch]
+
+    def update(self, file_paths, reporoot, workers, on_progress):
+      """Updates entries of the given files and evicts all the others.
+
+      Changed files are parsed on a pool of workers threads. on_progress is
+      called with dictionaries of path: CopiedFile values as they become
+      available, cached ones first. The last call has done set to True.
+      Entries of files that don't exist are not reported. The lock is only
+      held while entries are matched and merged, not while files are parsed.
+      """
+      stat_keys = []
+      for file_path in file_paths:
+        try:
+          stat = os.stat(file_path)
+        except OSError:
+          continue
+        stat_keys.append((file_path, (stat.st_mtime_ns, stat.st_size)))
+
+      entries = {}
+      data = {}
+      changed = []
+      with self._lock:
+        for file_path, stat_key in stat_keys:
+          entry = self._entries.get(file_path)
+          if entry is not None and entry[0] == stat_key:
+            entries[file_path] = entry
+            data[file_path] = entry[1]
+          else:
+            changed.append((file_path, stat_key))
+        self._entries = entries
+      if not changed:
+        on_progress(data, True)
+        return
+      on_progress(data, False)
+
+      data = {}
+      last_flush = monotonic()
+      with concurrent.futures.ThreadPoolExecutor(
+          max_workers=max(1, workers)) as executor:
+        futures = [
+            executor.submit(self._parse_batch,
+                            changed[i:i + COPIED_INFO_BATCH_SIZE], reporoot)
+            for i in range(0, len(changed), COPIED_INFO_BATCH_SIZE)]
+        for future in concurrent.futures.as_completed(futures):
+          parsed = future.result()
+          with self._lock:
+            for file_path, stat_key, copied in parsed:
+              self._entries[file_path] = (stat_key, copied)
+              data[file_path] = copied
+          if monotonic() - last_flush >= COPIED_INFO_FLUSH_INTERVAL_SEC:
+            on_progress(data, False)
+            data = {}
+            last_flush = monotonic()
+      on_progress(data, True)
+
+    def export_entries(self):
+      """Returns entries in a JSON serializable format.
+
+      Maps paths to [st_mtime_ns, st_size, last_synchronized,
+      copied_from_path] lists, or just [st_mtime_ns, st_size] for files that
+      are not copied.
+      """
+      with self._lock:
+        entries = {}
+        for file_path, (stat_key, copied) in self._entries.items():
+          entry = list(stat_key)
+          if copied:
+            entry += [copied['last_synchronized'], copied['copied_from_path']]
+          entries[file_path] = entry
+      return entries
+
+    def import_entries(self, entries, reporoot):
+      """Adds exported entries that aren't cached yet.
+
+      Returns a dictionary of path: copied info values of all the exported
+      paths, the cached ones for paths that were already cached.
+      """
+      data = {}
+      with self._lock:
+        for file_path, entry in entries.items():
+          cached = self._entries.get(file_path)
+          if cached is not None:
+            data[file_path] = cached[1]
+            continue
+          copied = None
+          if len(entry) == 4:
+            copied = SnapshotCopiedInfo(file_path, reporoot, entry[2],
+                                        entry[3], self._copied_file_class)
+          self._entries[file_path] = ((entry[0], entry[1]), copied)
+          data[file_path] = copied
+      return data
+
+    def refresh(self, file_paths, reporoot):
+      """Parses the given files again, keeping all the other entries.
+
+      Returns a dictionary of path: CopiedFile values of the files that
+      exist.
+      """
+      batch = []
+      for file_path in file_paths:
+        try:
+          stat = os.stat(file_path)
+        except OSError:
+          continue
+        batch.append((file_path, (stat.st_mtime_ns, stat.st_size)))
+      data = {}
+      parsed = self._parse_batch(batch, reporoot)
+      with self._lock:
+        for file_path, stat_key, copied in parsed:
+          self._entries[file_path] = (stat_key, copied)
+          data[file_path] = copied
+      return data
+
+    def make_info(self, file_path, reporoot, last_synchronized,
+                  copied_from_path):
+      """Returns copied info with the given fields, without parsing the
+      file."""
+      return SnapshotCopiedInfo(file_path, reporoot, last_synchronized,
+                                copied_from_path, self._copied_file_class)
+
+  class SnapshotFile(object):
+    """Compact on-disk snapshot of the list and of the copied info."""
+
+    def __init__(self, reporoot):
+      name = hashlib.sha1(reporoot.encode('utf-8')).hexdigest()[:16]
+      self._path = os.path.join(
+          sublime.cache_path(), 'IntakeToolkit', '%s.json.gz' % name)
+      self._reporoot = reporoot
+
+    def load(self):
+      """Returns the saved snapshot, or None if there is no usable one."""
+      try:
+        with open(self._path, 'rb') as snapshot_file:
+          snapshot = json.loads(
+              gzip.decompress(snapshot_file.read()).decode('utf-8'))
+      except (OSError, ValueError):
+        return None
+      if (snapshot.get('version') != SNAPSHOT_VERSION or
+          snapshot.get('reporoot') != self._reporoot):
+        return None
+      return snapshot
+
+    def save(self, model, copied_info_cache):
+      snapshot = {
+          'version': SNAPSHOT_VERSION,
+          'reporoot': self._reporoot,
+          'updated_at': model.updated_at,
+          'payload': model.to_payload(),
+          'copied_info': copied_info_cache.export_entries(),
+      }
+      data = gzip.compress(
+          json.dumps(snapshot, separators=(',', ':')).encode('utf-8'))
+      temp_path = self._path + '.tmp'
+      try:
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(temp_path, 'wb') as snapshot_file:
+          snapshot_file.write(data)
+        os.replace(temp_path, self._path)
+      except OSError:
+        traceback.print_exc()
 
   class CopiedInfoFetcherFileIOThread(threading.Thread):
-    def __init__(self, file_paths, reporoot, callback):
+    def __init__(self, file_paths, reporoot, cache, workers, callback):
       super(IWillDoList.CopiedInfoFetcherFileIOThread, self).__init__()
       self._file_paths = file_paths
       self._reporoot = reporoot
+      self._cache = cache
+      self._workers = workers
       self._callback = callback
 
+    def _on_progress(self, data, done):
+      sublime.set_timeout(partial(self._callback, data, done))
+
     def run(self):
-      data = {}
-      for file_path in self._file_paths:
-        if os.path.exists(file_path):
-          data[file_path] = CopiedFile.create(
-              file_path, self._reporoot, allow_caching=False)
-      sublime.set_timeout(partial(self._callback, data))
+      with timings.span('copied info scan', files=len(self._file_paths)):
+        self._cache.update(
+            self._file_paths, self._reporoot, self._workers, self._on_progress)
 
-  def __init__(self):
+  def __init__(self, reporoot):
     # The View that is currently showing the IWillDo list. Only one such view
-    # can exist at a time.
+    # can exist at a time for a repo root.
     self._view = None
     # Mapping from the line number in generated IWillDo list to an item object.
     self._line_to_item_mapping = {}
-    # Mapping from the line number to owners array.
-    self._line_to_owners_mapping = {}
+    # The list shown in the view.
+    self._list_model = ListModel({'groups': []}, '')
+    # Whether the list was fetched since the view was initialized. Until then
+    # the list from the snapshot is shown.
+    self._has_fetched_list = False
+    # Selects the items shown in the view.
+    self._list_filter = ListFilter()
+    # Index of the lines in the view.
+    self._line_index = IWillDoList.LineIndex()
     # A dictionary of path: CopiedInfo values.
     self._copied_info_data = {}
+    # Parsed CopiedInfo objects, reused between updates. Created once the
+    # libintake package is imported.
+    self._copied_info_cache = None
+    # CopiedInfo values received so far from the update in progress.
+    self._updated_copied_info_data = {}
+    # CopiedInfo values of the files that are being rewritten. Shown instead
+    # of what is read from the files until they are written.
+    self._pending_copied_info_data = {}
+    self._copied_info_workers = COPIED_INFO_WORKERS
     self._username = ''
     self._auth_token = ''
-    self._reporoot = ''
+    self._reporoot = reporoot
+    self._api_host = API_HOST
     self._upstream_sha = ''
-    self._repeating_thread = None
-    self._initialized = False
-
-  def __del__(self):
-    self._view = None
-    self._stop_repeating_thread_if_started()
-
-  def _stop_repeating_thread_if_started(self):
-    if self._repeating_thread:
-      self._repeating_thread.stop()
-      self._repeating_thread = None
+    self._check_interval = CHECK_INTERVAL_SEC
+    self._hidden_check_interval = HIDDEN_CHECK_INTERVAL_SEC
+    self._push_updates = False
+    # ListFeed updating the list, shared with the lists using the same API.
+    self._feed = None
+    # Mapping from (last_synchronized, base_commit, path) to the output of
+    # the upstream diff.
+    self._diff_cache = LruCache(DIFF_CACHE_MAX_ENTRIES)
+    # Mapping from the path to the last synchronized sha its upstream diff was
+    # prefetched for, against the current upstream sha.
+    self._prefetched_diffs = {}
+    # Mapping from (path, HEAD sha) to a (commits, complete) tuple where
+    # commits are (sha, date, author, summary) tuples read so far.
+    self._git_log_cache = LruCache(GIT_LOG_CACHE_MAX_ENTRIES)
+    # Mapping from (sha, path) to the output of git show.
+    self._git_show_cache = LruCache(GIT_SHOW_CACHE_MAX_ENTRIES)
+    # Reads files at the upstream commit. Created on first use.
+    self._cat_file_process = None
+
+  def _stop_updates(self):
+    if self._feed:
+      self._feed.remove_list(self)
 
   def initialize(self, view):
-    self._reporoot = view.settings().get(PREF_NAME_REPOROOT)
-    if not self._initialized:
+    if not self._copied_info_cache:
       # Import libintake package from the desktop tools dir. We have to do it
-      # only once. We must also make the imported module be visible in the
-      # global scope.
+      # only once.
       lib_path = os.path.join(self._reporoot, 'desktop', 'tools', 'libintake')
       if not os.path.exists(lib_path):
         sublime.error_message(
@@ -628,24 +3025,87 @@ class IWillDoList(object):
             'correctly in your project file.' % (lib_path, PREF_NAME_REPOROOT))
         view.run_command('close')
         return False
-      sys.path.append(lib_path)
-      global CopiedFile
-      from copied_file import CopiedFile
+      self._copied_info_cache = IWillDoList.CopiedInfoCache(
+          load_copied_file_class(lib_path))
 
+    self._stop_updates()
     self._view = view
     self._view.settings().set('is_will_do_list_view', True)
     self._username = view.settings().get(PREF_NAME_USERNAME)
     self._auth_token = view.settings().get(PREF_NAME_AUTHTOKEN)
     self._mergetool = view.settings().get(PREF_NAME_MERGETOOL, 'p4merge')
-    self._initialized = True
+    self._api_host = view.settings().get(PREF_NAME_API_HOST, API_HOST)
+    self._push_updates = view.settings().get(PREF_NAME_PUSH_UPDATES, False)
+    self._check_interval = view.settings().get(
+        PREF_NAME_CHECK_INTERVAL, CHECK_INTERVAL_SEC)
+    self._hidden_check_interval = view.settings().get(
+        PREF_NAME_HIDDEN_CHECK_INTERVAL, HIDDEN_CHECK_INTERVAL_SEC)
+    self._copied_info_workers = view.settings().get(
+        PREF_NAME_COPIED_INFO_WORKERS, COPIED_INFO_WORKERS)
+    http_client.set_timeout(
+        view.settings().get(PREF_NAME_HTTP_TIMEOUT, HTTP_TIMEOUT_SEC))
+    process_runner.set_max_running(view.settings().get(
+        PREF_NAME_MAX_RUNNING_JOBS, MAX_RUNNING_PROCESS_JOBS))
+    timings.set_log_path(view.settings().get(PREF_NAME_TIMINGS_LOG))
+    self._feed = iwilldolists.get_feed(
+        self.get_api_url(API_LATEST_LIST_PATH),
+        self.get_api_url(API_LIST_EVENTS_PATH),
+        self._auth_token)
+    self._has_fetched_list = False
+    self._load_snapshot()
     return True
 
+  def _load_snapshot(self):
+    """Shows the list saved on disk until the live one is fetched."""
+    snapshot_file = IWillDoList.SnapshotFile(self._reporoot)
+
+    def load():
+      snapshot = snapshot_file.load()
+      if snapshot:
+        sublime.set_timeout(partial(self._on_snapshot_loaded, snapshot))
+
+    file_io_queue.submit(None, load, first=True)
+
+  def _on_snapshot_loaded(self, snapshot):
+    if (self._has_fetched_list or not self._view or
+        snapshot['reporoot'] != self._reporoot):
+      return
+    self._copied_info_data = self._copied_info_cache.import_entries(
+        snapshot['copied_info'], self._reporoot)
+    self._list_model = ListModel(snapshot['payload'], self._reporoot,
+                                 self._list_model,
+                                 updated_at=snapshot['updated_at'],
+                                 stale=True)
+    self._view.run_command('will_do_list_update_with_data')
+
+  def _save_snapshot(self):
+    """Saves the fetched list and its copied info on the file IO thread."""
+    if not self._has_fetched_list or self._list_model.error:
+      return
+    snapshot_file = IWillDoList.SnapshotFile(self._reporoot)
+    # Deltas take over the groups of the model while it's being saved.
+    model = self._list_model.copy()
+    cache = self._copied_info_cache
+    file_io_queue.submit(('snapshot', self._reporoot),
+                         partial(snapshot_file.save, model, cache))
+
   def get_view(self):
     return self._view
 
   def get_username(self):
     return self._username
 
+  def get_check_intervals(self):
+    """Returns update intervals of the shown and of the hidden view."""
+    return self._check_interval, self._hidden_check_interval
+
+  def get_push_updates(self):
+    return self._push_updates
+
+  def get_api_url(self, path):
+    """Returns URL of the API endpoint at path."""
+    return '%s/%s' % (self._api_host.rstrip('/'), path)
+
   def get_usermail(self):
     return self._username + '@opera.com'
 
@@ -655,31 +3115,268 @@ class IWillDoList(object):
   def get_mergetool(self):
     return self._mergetool
 
+  def set_items_synchronized(self, items):
+    """Sets the last synchronized sha of the items to the upstream sha.
+
+    Statuses of the items change right away while the files are rewritten
+    on the file IO thread, all in one job, and parsed again.
+    """
+    sha = self._upstream_sha
+    copied_infos = {}
+    for item in items:
+      copied_info = self.get_copied_info_for_item(item)
+      if copied_info and copied_info['last_synchronized'] != sha:
+        copied_infos[item.path] = copied_info
+    if not copied_infos:
+      return
+    synchronized_infos = {
+        path: self._copied_info_cache.make_info(
+            path, self._reporoot, sha, copied_info['copied_from_path'])
+        for path, copied_info in copied_infos.items()}
+    cache = self._copied_info_cache
+    reporoot = self._reporoot
+
+    def write():
+      failed_count = 0
+      data = {}
+      try:
+        with timings.span('last sync write', files=len(copied_infos)):
+          for copied_info in copied_infos.values():
+            try:
+              copied_info.set_last_sync(sha)
+            except Exception:
+              traceback.print_exc()
+              failed_count += 1
+          # Rewritten files may keep their size and, on coarse-grained file
+          # systems, their modification time.
+          data = cache.refresh(list(copied_infos), reporoot)
+      finally:
+        sublime.set_timeout(partial(self._on_last_syncs_written,
+                                    synchronized_infos, data, failed_count))
+
+    if not file_io_queue.submit(None, write):
+      sublime.status_message('IWillDo: too many pending writes, try again.')
+      return
+    self._pending_copied_info_data.update(synchronized_infos)
+    self._set_copied_info_data(synchronized_infos)
+
+  def _on_last_syncs_written(self, synchronized_infos, data, failed_count):
+    for path, copied_info in synchronized_infos.items():
+      if self._pending_copied_info_data.get(path) is copied_info:
+        del self._pending_copied_info_data[path]
+    if failed_count:
+      sublime.status_message(
+          'IWillDo: failed updating %d of the files.' % failed_count)
+    self._set_copied_info_data(data)
+    if self._view and self._list_filter.depends_on_copied_info():
+      self._view.run_command('will_do_list_update_with_data')
+
+  def _set_copied_info_data(self, data):
+    """Updates copied info of the given files outside of a scan."""
+    self._copied_info_data.update(data)
+    # A scan in progress replaces the copied info once it's done, so only
+    # update what it already reported instead of adding entries to it.
+    updated_data = self._updated_copied_info_data
+    updated_data.update((path, copied_info)
+                        for path, copied_info in data.items()
+                        if path in updated_data)
+    self._update_unhandled_lines()
+    if self._view:
+      self._view.run_command('will_do_list_update_gutter_marks')
+
   def get_copied_info_for_item(self, item):
-    absolute_path = get_item_path(item)
-    if absolute_path in self._copied_info_data:
-      return self._copied_info_data[absolute_path]
-    return None
+    return self._copied_info_data.get(item.path)
+
+  def _is_unhandled_by_user(self, line):
+    """Whether item at line is assigned to the user and not synchronized."""
+    item = self._line_to_item_mapping[line]
+    if self.get_usermail() not in item.owners:
+      return False
+    copied_info = self.get_copied_info_for_item(item)
+    return (copied_info is None or
+            copied_info['last_synchronized'] != self.get_upstream_sha())
+
+  def _update_unhandled_lines(self):
+    self._line_index.set_unhandled_lines(
+        [line for line in self._line_index.get_item_lines()
+         if self._is_unhandled_by_user(line)])
 
   def scroll_to_next_unhandled_item_after_line(self, line):
-    """Returns copied info for the next unhandled item after line nr."""
+    """Moves cursor to the next unhandled item at or after line nr."""
+
+    next_line = self._line_index.get_next_unhandled_line(line)
+    if next_line is not None:
+      line_region = self._line_index.get_line_region(next_line)
+      self.get_view().sel().clear()
+      self.get_view().sel().add(sublime.Region(line_region.a, line_region.a))
+      self.get_view().show(line_region)
+
+  def get_upstream_diff(self, copied_info, callback=None):
+    """Computes upstream changes of a copied file on the git thread.
+
+    Diffs are cached so callback, if given, might be called synchronously. It
+    gets the git command and its output. Without a callback the diff is only
+    prefetched, after all the other pending git commands.
+    """
+    command = get_upstream_diff_command(copied_info, self._upstream_sha,
+                                        self._reporoot)
+    key = (copied_info['last_synchronized'], self._upstream_sha, command[-1])
+    output = self._diff_cache.get(key)
+    if output is not None:
+      if callback:
+        callback(command, output)
+      return
 
-    lines_regions = self.get_view().lines(
-        sublime.Region(0, self.get_view().size()))
-    for i in self._line_to_item_mapping:
-      if i < line:
-        continue
-      copied_info = self.get_copied_info_for_item(
-          self._line_to_item_mapping[i])
-      owners = self._line_to_owners_mapping[i]
-      if (self.get_usermail() in owners and
-          (copied_info is None or
-              copied_info['last_synchronized'] != self.get_upstream_sha())):
-        self.get_view().sel().clear()
-        line_start = lines_regions[i].a
-        self.get_view().sel().add(sublime.Region(line_start, line_start))
-        self.get_view().show(lines_regions[i])
-        break
+    def handle_output(output, returncode):
+      if returncode != 1:
+        output = 'No changes'
+      self._diff_cache.put(key, output)
+      return output
+
+    chromium_src = normalize_path(
+        os.path.join(self._reporoot, 'chromium', 'src'))
+    job = IWillDoList.GitJob(
+        command, chromium_src, handle_output,
+        partial(callback, command) if callback else None)
+    git_queue.submit(('diff',) + key, job, IWillDoList.GitJob.merge,
+                     first=callback is not None)
+
+  def read_upstream_files(self, copied_infos, callback):
+    """Reads the upstream files at the base commit on the git thread.
+
+    callback is called on the UI thread with a list of (copied_info, content)
+    tuples, where content is None if the file doesn't exist at that commit.
+    All the files are read in a single round trip to git.
+    """
+    chromium_src = normalize_path(
+        os.path.join(self._reporoot, 'chromium', 'src'))
+    if (not self._cat_file_process or
+        self._cat_file_process.get_repo_dir() != chromium_src):
+      if self._cat_file_process:
+        self._cat_file_process.close()
+      self._cat_file_process = GitCatFileProcess(chromium_src)
+    cat_file_process = self._cat_file_process
+    specs = ['%s:%s' % (
+        self._upstream_sha,
+        transform_path_absolute(info['copied_from_path'], self._reporoot)[
+            len(chromium_src) + 1:])
+        for info in copied_infos]
+
+    def read_files():
+      try:
+        contents = cat_file_process.read_objects(specs)
+      except (OSError, ValueError):
+        contents = [None] * len(specs)
+      sublime.set_timeout(
+          partial(callback, list(zip(copied_infos, contents))))
+
+    git_queue.submit(None, read_files, first=True)
+
+  def close(self):
+    """Releases processes and connections kept in the background."""
+    self._stop_updates()
+    if self._cat_file_process:
+      self._cat_file_process.close()
+      self._cat_file_process = None
+
+  def get_git_log(self, path, page, callback):
+    """Reads git log of the file on the git thread, a page at a time.
+
+    Logs are cached per HEAD commit so that only pages that weren't read
+    before run git log. callback is called on the UI thread with commits of
+    all the pages up to the given one and a flag telling whether there are
+    more.
+    """
+    reporoot = self._reporoot
+
+    def read_log():
+      output = run_process(['git', 'rev-parse', 'HEAD'], reporoot)[0]
+      key = (path, (output or '').strip())
+      commits, complete = self._git_log_cache.get(key, ([], False))
+      count = (page + 1) * GIT_LOG_PAGE_SIZE
+      if len(commits) < count and not complete:
+        command = ['git',
+                   'log',
+                   '--pretty=%H;(%ar) %ad;%aE;%s',
+                   '--date=local',
+                   '--skip=%d' % len(commits),
+                   '--max-count=%d' % (count - len(commits)),
+                   '--',
+                   path]
+        output = run_process(command, reporoot)[0] or ''
+        new_commits = [tuple(line.split(';', 3))
+                       for line in output.split('\n') if line.strip()]
+        complete = len(new_commits) < count - len(commits)
+        commits = commits + new_commits
+        self._git_log_cache.put(key, (commits, complete))
+      has_more = len(commits) > count or not complete
+      sublime.set_timeout(partial(callback, commits[:count], has_more))
+
+    git_queue.submit(('log', path, page), read_log, first=True)
+
+  def get_git_show(self, sha, path, callback):
+    """Runs git show of the commit limited to the file on the git thread.
+
+    callback is called on the UI thread with the git command and its output.
+    Outputs are cached.
+    """
+    command = ['git', 'show', sha, '--exit-code', '--', path]
+    output = self._git_show_cache.get((sha, path))
+    if output is not None:
+      callback(command, output)
+      return
+
+    def handle_output(output, returncode):
+      output = output or 'No changes'
+      self._git_show_cache.put((sha, path), output)
+      return output
+
+    job = IWillDoList.GitJob(command, self._reporoot, handle_output,
+                             partial(callback, command))
+    git_queue.submit(('show', sha, path), job, IWillDoList.GitJob.merge,
+                     first=True)
+
+  def _prefetch_upstream_diffs(self):
+    """Queues upstream diffs of the user's unhandled items that follow the
+    cursor.
+
+    Diffs are prefetched only as many as the cache holds, and only once per
+    upstream and last synchronized sha, even if they were evicted since.
+    """
+    selection = self._view.sel()
+    cursor_line = (self._line_index.get_line_at(selection[0].begin())
+                   if len(selection) else 0)
+    for line in self._line_index.get_unhandled_lines_after(
+        cursor_line, DIFF_PREFETCH_MAX_ITEMS):
+      item = self._line_to_item_mapping[line]
+      copied_info = self.get_copied_info_for_item(item)
+      if (copied_info and self._prefetched_diffs.get(item.path) !=
+          copied_info['last_synchronized']):
+        self._prefetched_diffs[item.path] = copied_info['last_synchronized']
+        self.get_upstream_diff(copied_info)
+
+  def get_list_filter(self):
+    return self._list_filter
+
+  def set_list_filter(self, list_filter):
+    """Renders the list again, showing only the items list_filter selects."""
+    self._list_filter = list_filter
+    if self._view:
+      self._view.run_command('will_do_list_update_with_data')
+
+  def _is_synchronized(self, upstream_sha, item):
+    copied_info = self.get_copied_info_for_item(item)
+    return bool(copied_info and
+                copied_info['last_synchronized'] == upstream_sha)
+
+  def get_visible_item_ids(self, model):
+    """Returns ids of the items of model to show, or None to show all."""
+    if self._list_filter.mode == ListFilter.ALL:
+      # Don't build the index when it isn't needed.
+      return None
+    return self._list_filter.get_visible_ids(
+        model.get_index(), self._username, self.get_usermail(),
+        partial(self._is_synchronized, model.base_commit))
 
   def get_line_to_item_mapping(self):
     return self._line_to_item_mapping
@@ -687,37 +3384,59 @@ class IWillDoList(object):
   def set_line_to_item_mapping(self, mapping):
     self._line_to_item_mapping = mapping
 
-  def set_line_to_owners_mapping(self, mapping):
-    self._line_to_owners_mapping = mapping
+  def get_list_model(self):
+    return self._list_model
+
+  def get_line_index(self):
+    return self._line_index
+
+  def set_line_index(self, line_index):
+    """Sets index of the freshly rendered lines. Mappings must be set first."""
+    self._line_index = line_index
+    self._update_unhandled_lines()
 
   def get_upstream_sha(self):
     return self._upstream_sha
 
   def set_upstream_sha(self, sha):
+    if sha != self._upstream_sha:
+      # Cached diffs are all against the previous base commit.
+      self._diff_cache.clear()
+      self._prefetched_diffs = {}
     self._upstream_sha = sha
 
   def get_items_for_selection(self, view):
     items = []
+    seen_lines = set()
     for region in view.sel():
-      lines = []
-      for line_region in view.lines(region):
-        line_nr = view.rowcol(line_region.a)[0]
-        if line_nr not in lines:
-          if line_nr in self._line_to_item_mapping:
-            items.append(self._line_to_item_mapping[line_nr])
+      for line in self._line_index.get_item_lines_between(
+          self._line_index.get_line_at(region.begin()),
+          self._line_index.get_line_at(region.end())):
+        if line not in seen_lines:
+          seen_lines.add(line)
+          items.append(self._line_to_item_mapping[line])
     return items
 
   def on_view_closing(self, view):
     if self._view and self._view.id() == view.id():
       self._view = None
-      self._stop_repeating_thread_if_started()
+      self._stop_updates()
+
+  def make_request(self, URL, method, fields, callback=None):
+    """Queues a request sending fields as JSON. Requests made to the same URL
+    while a previous one is still pending are merged."""
+    request = IWillDoList.NetworkRequest(
+        URL, method, fields, self._auth_token, callback)
+    submit_request((method, URL), request)
 
-  def make_request(self, URL, method, data, callback):
-    IWillDoList.NetworkWorkerThread(
-        URL, method, data, self._auth_token, callback, False).start()
+  def trigger_update(self, repeating=False, force=False):
+    """Queues update of the list on the network thread.
 
-  def trigger_update(self, repeating=False):
-    """Triggers update of the list on the network thread."""
+    Unless force is set, the update is skipped when the fetched list doesn't
+    differ from the one that is currently shown. Pending updates are merged
+    into one. When repeating, the list keeps being updated until the view is
+    closed.
+    """
 
     # Can't 100% rely on on_pre_close event firing. It doesn't when closing
     # window for example. Not sure if checking buffer_id is the official way for
@@ -725,43 +3444,151 @@ class IWillDoList(object):
     if self._view and self._view.buffer_id() == 0:
       self.on_view_closing(self._view)
 
+    if not self._view:
+      return
+    if repeating:
+      self._feed.add_list(self)
+      self._feed.update_view_visibility()
+    else:
+      self._feed.trigger_update(force)
+
+  def is_waiting_for_list(self):
+    """Whether there is nothing to show in the view yet."""
+    return not self._has_fetched_list and not self._list_model.groups
+
+  def is_view_visible(self):
+    """Whether the view is shown in any of the groups of its window."""
+    view = self._view
+    window = view.window() if view else None
+    return bool(window) and any(
+        window.active_view_in_group(group) == view
+        for group in range(window.num_groups()))
+
+  def show_partial_data(self, data):
+    """Renders the beginning of the list while the rest is downloaded."""
+    if self._has_fetched_list and not self._list_model.partial:
+      return
+    self._has_fetched_list = True
+    self._list_model = ListModel(data, self._reporoot, self._list_model,
+                                 partial=True)
     if self._view:
-      thread = IWillDoList.NetworkWorkerThread(
-          API_LATEST_LIST_URL,
-          'GET',
-          None,
-          self._auth_token,
-          IWillDoList.on_data_fetched,
-          repeating)
-      thread.start()
-      if repeating:
-        self._stop_repeating_thread_if_started()
-        self._repeating_thread = thread
-
-  @staticmethod
-  def on_data_fetched(data):
-    """Global callback function instead of a IWillDoList class member to avoid
-       locking the class instance when it needs to be garbage collected."""
-
-    iwilldolist.update_view_with_data(data)
-    iwilldolist.update_copied_info_data(data)
+      self._view.run_command('will_do_list_update_with_data')
 
   def update_view_with_data(self, data):
+    if data.get('delta'):
+      if data.get('since') != self._list_model.revision:
+        # The delta doesn't apply to the shown list.
+        if self._feed:
+          self._feed.request_full_sync()
+        return
+      self._list_model = self._list_model.apply_delta(data)
+    else:
+      self._list_model = ListModel(data, self._reporoot, self._list_model)
+    self._has_fetched_list = True
     if self._view:
-      self._view.run_command('will_do_list_update_with_data', {'data': data})
+      self._view.run_command('will_do_list_update_with_data')
 
-  def update_copied_info_data(self, data):
-    paths = []
-    for group in data['groups']:
-      for item in group['items']:
-        paths.append(get_item_path(item))
+  def update_copied_info_data(self):
+    if self._list_model.error:
+      return
+    paths = [item.path for item in self._list_model.get_items()]
     IWillDoList.CopiedInfoFetcherFileIOThread(
-        paths, self._reporoot, self._on_copied_info_updated).start()
-
-  def _on_copied_info_updated(self, data):
-    self._copied_info_data = data
+        paths, self._reporoot, self._copied_info_cache,
+        self._copied_info_workers, self._on_copied_info_updated).start()
+
+  def _on_copied_info_updated(self, data, done):
+    # Show partial results right away but only drop entries of the files that
+    # are gone once the update is complete.
+    pending_data = self._pending_copied_info_data
+    if pending_data:
+      data = dict(data)
+      data.update((path, copied_info)
+                  for path, copied_info in pending_data.items()
+                  if path in data)
+    self._updated_copied_info_data.update(data)
+    self._copied_info_data.update(data)
+    self._update_unhandled_lines()
+    if done:
+      self._copied_info_data = self._updated_copied_info_data
+      self._updated_copied_info_data = {}
+      self._save_snapshot()
+      if self._view:
+        self._prefetch_upstream_diffs()
+        if self._list_filter.depends_on_copied_info():
+          self._view.run_command('will_do_list_update_with_data')
     if self._view:
       self._view.run_command('will_do_list_update_gutter_marks')
 
 
-iwilldolist = IWillDoList()
+class IWillDoLists(object):
+  """IWillDo lists of all the repo roots.
+
+  Lists fetched from the same API endpoint with the same token share a
+  ListFeed, so opening more lists doesn't add more polling or fetches.
+  """
+
+  def __init__(self):
+    # Mapping from the repo root to its IWillDoList.
+    self._lists = {}
+    # Mapping from (URL of the list, auth token) to the ListFeed.
+    self._feeds = {}
+
+  def get(self, reporoot):
+    """Returns the list of the repo root, creating it on first use."""
+    iwilldolist = self._lists.get(reporoot)
+    if iwilldolist is None:
+      iwilldolist = self._lists[reporoot] = IWillDoList(reporoot)
+    return iwilldolist
+
+  def get_for_view(self, view):
+    """Returns the list shown in view or the one of the view's repo root."""
+    for iwilldolist in self._lists.values():
+      list_view = iwilldolist.get_view()
+      if list_view and list_view.id() == view.id():
+        return iwilldolist
+    return self._lists.get(view.settings().get(PREF_NAME_REPOROOT))
+
+  def get_feed(self, url, events_url, auth_token):
+    feed = self._feeds.get((url, auth_token))
+    if feed is None:
+      feed = self._feeds[(url, auth_token)] = IWillDoList.ListFeed(
+          url, events_url, auth_token)
+    return feed
+
+  def update_view_visibility(self):
+    for feed in list(self._feeds.values()):
+      feed.update_view_visibility()
+
+  def on_view_closing(self, view):
+    for iwilldolist in list(self._lists.values()):
+      iwilldolist.on_view_closing(view)
+
+  def close(self):
+    for iwilldolist in self._lists.values():
+      iwilldolist.close()
+    for feed in self._feeds.values():
+      feed.stop()
+
+
+# Shared by all network requests so that connections to the API are reused.
+http_client = PooledHttpClient()
+# Executes all network requests, one at a time.
+network_queue = CoalescingWorkQueue('IWillDo network',
+                                    NETWORK_QUEUE_MAX_PENDING)
+# Executes git commands that don't need to block the UI, one at a time.
+git_queue = CoalescingWorkQueue('IWillDo git', GIT_QUEUE_MAX_PENDING)
+# Durations of the recent operations.
+timings = PerformanceTimings(TIMING_SAMPLES)
+# Reads and writes files that don't need to block the UI, one at a time.
+file_io_queue = CoalescingWorkQueue('IWillDo file IO',
+                                    FILE_IO_QUEUE_MAX_PENDING)
+# Runs merge tools and comparisons, a few at a time.
+process_runner = ProcessJobRunner(MAX_RUNNING_PROCESS_JOBS,
+                                  PROCESS_JOBS_MAX_PENDING)
+iwilldolists = IWillDoLists()
+
+
+def plugin_unloaded():
+  iwilldolists.close()
+  process_runner.cancel()
+  http_client.close()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Headless benchmarks of the hot paths of iwilldo.py.
+
+Runs the plugin against the stand-ins of the Sublime API and of the
+copied_file module from tools/stubs, on synthetic intakes of various sizes,
+and prints the results as JSON so that they can be compared between
+versions:
+
+  python3 tools/benchmark.py --sizes 100,1000,10000 --output before.json
+"""
+
+import argparse
+import itertools
+import json
+import os.path
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(TOOLS_DIR, 'stubs'), os.path.dirname(TOOLS_DIR)]
+
+import sublime
+import iwilldo
+import synthetic_intake
+
+DEFAULT_SIZES = '100,1000,10000,50000'
+DEFAULT_REPEAT = 5
+USERNAME = 'benchmark.user'
+# Share of items that get a different claim between renders.
+CHANGED_ITEMS_RATIO = 0.01
+# Number of cursors used by the selection mapping benchmark.
+SELECTION_CURSORS = 1000
+# Number of jumps done by the navigation benchmark.
+NAVIGATION_JUMPS = 100
+
+
+def measure(function, repeat, setup=None):
+  """Returns durations of the calls of function, in milliseconds."""
+  durations = []
+  for _ in range(repeat):
+    if setup:
+      setup()
+    start = time.perf_counter()
+    function()
+    durations.append(1000 * (time.perf_counter() - start))
+  return durations
+
+
+class IntakeBenchmark(object):
+  """Benchmarks of a single synthetic intake."""
+
+  def __init__(self, item_count, workdir, repeat):
+    self._item_count = item_count
+    self._repeat = repeat
+    self._reporoot = os.path.join(workdir, 'repo%d' % item_count)
+    self._payload = synthetic_intake.make_payload(item_count, USERNAME)
+    synthetic_intake.write_repository(self._reporoot, self._payload)
+    self._window = sublime.Window()
+    self._view = None
+    self._list = iwilldo.iwilldolists.get(self._reporoot)
+    self._copied_file_class = iwilldo.load_copied_file_class(
+        os.path.join(self._reporoot, 'desktop', 'tools', 'libintake'))
+    self._paths = [iwilldo.make_item_path(item['name'], self._reporoot)
+                   for group in self._payload['groups']
+                   for item in group['items']]
+
+  def _open_view(self):
+    view = self._window.new_file()
+    view.settings().set(iwilldo.PREF_NAME_USERNAME, USERNAME)
+    view.settings().set(iwilldo.PREF_NAME_REPOROOT, self._reporoot)
+    view.settings().set(iwilldo.PREF_NAME_AUTHTOKEN, 'token')
+    self._list.initialize(view)
+    sublime.run_timeouts()
+    self._view = view
+
+  def _render(self, payload=None):
+    self._list.update_view_with_data(payload or self._payload)
+
+  def _make_changed_payload(self, variant):
+    payload = json.loads(json.dumps(self._payload))
+    step = max(1, int(1 / CHANGED_ITEMS_RATIO))
+    for group in payload['groups']:
+      for item in group['items']:
+        if item['id'] % step == variant:
+          item['claimed_by'] = USERNAME
+    return payload
+
+  def _load_copied_info(self):
+    cache = iwilldo.IWillDoList.CopiedInfoCache(self._copied_file_class)
+    loaded = {}
+
+    def on_progress(data, done):
+      loaded.update(data)
+
+    cache.update(self._paths, self._reporoot, iwilldo.COPIED_INFO_WORKERS,
+                 on_progress)
+    # Pass the data the way the fetcher thread does, without prefetching
+    # diffs of the unhandled items.
+    self._list._on_copied_info_updated(loaded, False)
+
+  def run(self):
+    results = {}
+    results['render_initial'] = measure(self._render, self._repeat,
+                                        setup=self._open_view)
+    self._load_copied_info()
+    payloads = itertools.cycle(
+        [self._make_changed_payload(variant) for variant in (0, 1)])
+    results['render_changed_claims'] = measure(
+        lambda: self._render(next(payloads)), self._repeat)
+    unchanged_payload = next(payloads)
+    self._render(unchanged_payload)
+    results['render_unchanged'] = measure(
+        lambda: self._render(unchanged_payload), self._repeat)
+
+    shas = itertools.cycle(
+        [synthetic_intake.PREVIOUS_COMMIT, synthetic_intake.BASE_COMMIT])
+    results['gutter_marks_all_changed'] = measure(
+        lambda: self._view.run_command('will_do_list_update_gutter_marks'),
+        self._repeat,
+        setup=lambda: self._list.set_upstream_sha(next(shas)))
+    results['gutter_marks_unchanged'] = measure(
+        lambda: self._view.run_command('will_do_list_update_gutter_marks'),
+        self._repeat)
+
+    results['selection_mapping_all'] = measure(
+        lambda: self._list.get_items_for_selection(self._view),
+        self._repeat, setup=self._select_all)
+    results['selection_mapping_cursors'] = measure(
+        lambda: self._list.get_items_for_selection(self._view),
+        self._repeat, setup=self._add_cursors)
+    results['next_item_navigation'] = measure(
+        self._navigate, self._repeat, setup=self._select_start)
+
+    results['copied_info_scan_cold'] = measure(
+        lambda: self._scan(
+            iwilldo.IWillDoList.CopiedInfoCache(self._copied_file_class)),
+        self._repeat)
+    warm_cache = iwilldo.IWillDoList.CopiedInfoCache(self._copied_file_class)
+    self._scan(warm_cache)
+    results['copied_info_scan_warm'] = measure(
+        lambda: self._scan(warm_cache), self._repeat)
+    self._list.on_view_closing(self._view)
+    return results
+
+  def _select_all(self):
+    selection = self._view.sel()
+    selection.clear()
+    selection.add(sublime.Region(0, self._view.size()))
+
+  def _add_cursors(self):
+    selection = self._view.sel()
+    selection.clear()
+    step = max(1, self._view.size() // SELECTION_CURSORS)
+    for point in range(0, self._view.size(), step):
+      selection.add(sublime.Region(point))
+
+  def _select_start(self):
+    selection = self._view.sel()
+    selection.clear()
+    selection.add(sublime.Region(0))
+
+  def _navigate(self):
+    for _ in range(NAVIGATION_JUMPS):
+      self._view.run_command('will_do_list_go_to_next')
+
+  def _scan(self, cache):
+    cache.update(self._paths, self._reporoot, iwilldo.COPIED_INFO_WORKERS,
+                 lambda data, done: None)
+
+
+def summarize(durations):
+  return {
+      'min_ms': round(min(durations), 3),
+      'median_ms': round(statistics.median(durations), 3),
+      'max_ms': round(max(durations), 3),
+      'samples': len(durations),
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                      help='comma separated numbers of items in the intakes')
+  parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                      help='number of timed runs of every benchmark')
+  parser.add_argument('--output', help='write the results to this file')
+  args = parser.parse_args()
+
+  workdir = tempfile.mkdtemp(prefix='iwilldo-benchmark-')
+  sublime.set_cache_path(os.path.join(workdir, 'cache'))
+  report = {
+      'python': platform.python_version(),
+      'platform': sys.platform,
+      'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+      'repeat': args.repeat,
+      'results': [],
+  }
+  try:
+    for size in [int(size) for size in args.sizes.split(',')]:
+      results = IntakeBenchmark(size, workdir, args.repeat).run()
+      for name, durations in sorted(results.items()):
+        result = {'items': size, 'benchmark': name}
+        result.update(summarize(durations))
+        report['results'].append(result)
+        print('%6d items  %-28s %10.3f ms' % (size, name, result['median_ms']),
+              file=sys.stderr)
+  finally:
+    shutil.rmtree(workdir, ignore_errors=True)
+
+  output = json.dumps(report, indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, 'w') as output_file:
+      output_file.write(output + '\n')
+  else:
+    print(output)
+
+
+if __name__ == '__main__':
+  main()
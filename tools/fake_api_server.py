@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""Local stand-in for the IWillDo API.
+
+Serves a synthetic intake at the endpoints used by the plugin, with optional
+latency, errors and changes made by other users, so that the network layer
+can be exercised reproducibly. Point the plugin at it with:
+
+  "will_do_list_api_host": "http://127.0.0.1:8000/"
+
+Changes are also announced as server-sent events, for clients with the
+"will_do_list_push_updates" pref set, unless started with --no-push. The list
+can be fetched as the changes since a revision, unless started with
+--no-delta.
+
+Faults can be changed while the server is running by posting JSON to
+/_control, e.g. {"error_rate": 1.0}. Request counts are served at /_stats.
+"""
+
+import argparse
+import collections
+import gzip
+import http.server
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+
+import synthetic_intake
+
+LATEST_LIST_PATH = '/api/iwilldo/combined/latest'
+LIST_EVENTS_PATH = '/api/iwilldo/combined/events'
+UPDATE_ITEM_PATH_RE = re.compile(r'^/api/iwilldo/items/(\d+)/$')
+CONTROL_PATH = '/_control'
+STATS_PATH = '/_stats'
+# Item fields that can be changed with a PATCH request.
+EDITABLE_FIELDS = ('claimed_by', 'closed')
+# Interval (in seconds) of the keep-alive comments sent to push clients.
+KEEP_ALIVE_INTERVAL_SEC = 15
+# Number of changes kept for computing deltas. Clients that are further
+# behind get the whole list.
+MAX_CHANGE_LOG_ENTRIES = 10000
+
+
+class IntakeState(object):
+  """The served intake and its encoded forms, safe to use from all threads."""
+
+  def __init__(self, payload, with_revision=True):
+    self._lock = threading.Condition()
+    self._payload = payload
+    self._with_revision = with_revision
+    # Incremented on every change.
+    self._revision = 1
+    self._items_by_id = {}
+    self._group_titles_by_id = {}
+    for group in payload['groups']:
+      for item in group['items']:
+        self._items_by_id[item['id']] = item
+        self._group_titles_by_id[item['id']] = group['title']
+    # List of (revision, item id) tuples, oldest first.
+    self._changes = collections.deque(maxlen=MAX_CHANGE_LOG_ENTRIES)
+    self._encoded = None
+
+  def get_etag(self):
+    with self._lock:
+      return '"%d"' % self._revision
+
+  def get_encoded(self):
+    """Returns a (body, gzipped body) tuple of the whole list."""
+    with self._lock:
+      if self._encoded is None:
+        if self._with_revision:
+          self._payload['revision'] = self._revision
+        body = json.dumps(self._payload, separators=(',', ':')).encode('utf-8')
+        self._encoded = (body, gzip.compress(body))
+      return self._encoded
+
+  def get_delta(self, since):
+    """Returns changes since the revision, or None if they are not known."""
+    with self._lock:
+      oldest = self._changes[0][0] if self._changes else self._revision
+      if since > self._revision or since < oldest - 1:
+        return None
+      changed_ids = []
+      for revision, item_id in reversed(self._changes):
+        if revision <= since:
+          break
+        if item_id not in changed_ids:
+          changed_ids.append(item_id)
+      changed = []
+      for item_id in reversed(changed_ids):
+        item = dict(self._items_by_id[item_id])
+        item['group'] = self._group_titles_by_id[item_id]
+        changed.append(item)
+      return {
+          'delta': True,
+          'since': since,
+          'revision': self._revision,
+          'changed': changed,
+          'removed': [],
+      }
+
+  def get_item_ids(self):
+    with self._lock:
+      return list(self._items_by_id)
+
+  def update_item(self, item_id, fields):
+    """Changes fields of the item. Returns the item or None if not found."""
+    with self._lock:
+      item = self._items_by_id.get(item_id)
+      if item is None:
+        return None
+      item.update(fields)
+      self._encoded = None
+      self._revision += 1
+      self._changes.append((self._revision, item_id))
+      self._lock.notify_all()
+      return dict(item)
+
+  def get_revision(self):
+    with self._lock:
+      return self._revision
+
+  def wait_for_change(self, revision, timeout):
+    """Waits until the revision differs from the given one. Returns it."""
+    with self._lock:
+      self._lock.wait_for(lambda: self._revision != revision, timeout)
+      return self._revision
+
+
+class Faults(object):
+  """Latency and errors injected into the responses."""
+
+  def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0,
+               error_status=503, seed=0):
+    self._lock = threading.Lock()
+    self._random = random.Random(seed)
+    self.latency_ms = latency_ms
+    self.jitter_ms = jitter_ms
+    self.error_rate = error_rate
+    self.error_status = error_status
+
+  def update(self, settings):
+    with self._lock:
+      for name in ('latency_ms', 'jitter_ms', 'error_rate', 'error_status'):
+        if name in settings:
+          setattr(self, name, type(getattr(self, name))(settings[name]))
+
+  def to_dict(self):
+    with self._lock:
+      return {
+          'latency_ms': self.latency_ms,
+          'jitter_ms': self.jitter_ms,
+          'error_rate': self.error_rate,
+          'error_status': self.error_status,
+      }
+
+  def apply(self):
+    """Sleeps for the injected latency. Returns an error status or None."""
+    with self._lock:
+      delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+      failed = self._random.random() < self.error_rate
+      error_status = self.error_status
+    if delay:
+      time.sleep(delay / 1000)
+    return error_status if failed else None
+
+
+class Mutator(threading.Thread):
+  """Changes claims and states of random items, as other users would."""
+
+  def __init__(self, state, interval, count, seed=0):
+    super().__init__(name='Mutator', daemon=True)
+    self._state = state
+    self._interval = interval
+    self._count = count
+    self._random = random.Random(seed)
+
+  def run(self):
+    item_ids = self._state.get_item_ids()
+    usernames = [synthetic_intake.get_username(index)
+                 for index in range(synthetic_intake.USER_COUNT)]
+    while True:
+      time.sleep(self._interval)
+      for item_id in self._random.sample(item_ids,
+                                         min(self._count, len(item_ids))):
+        if self._random.random() < 0.5:
+          fields = {'claimed_by': self._random.choice(usernames)}
+        else:
+          fields = {'closed': self._random.random() < 0.5}
+        self._state.update_item(item_id, fields)
+
+
+class Stats(object):
+  """Counts of the handled requests."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._counts = collections.Counter()
+
+  def count(self, method, path, status):
+    # Item URLs are counted together.
+    path = UPDATE_ITEM_PATH_RE.sub('/api/iwilldo/items/<id>/', path)
+    path = re.sub(r'=\d+', '=<n>', path)
+    with self._lock:
+      self._counts['%s %s %d' % (method, path, status)] += 1
+
+  def to_dict(self):
+    with self._lock:
+      return dict(self._counts)
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  server_version = 'FakeIWillDo/1.0'
+
+  def setup(self):
+    super().setup()
+    self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+  def log_message(self, format, *args):
+    if self.server.verbose:
+      super().log_message(format, *args)
+
+  def _respond(self, status, body=b'', headers=None):
+    """Writes the whole response at once.
+
+    Writing the headers and the body separately makes the client wait for
+    a delayed ACK of the first segment.
+    """
+    lines = ['HTTP/1.1 %d %s' % (status, self.responses[status][0]),
+             'Server: %s' % self.server_version,
+             'Date: %s' % self.date_time_string(),
+             'Content-Length: %d' % len(body)]
+    for name, value in (headers or {}).items():
+      lines.append('%s: %s' % (name, value))
+    head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+    self.wfile.write(head + body)
+    self.log_request(status, len(body))
+    self.server.stats.count(self.command, self.path, status)
+
+  def _respond_json(self, status, data):
+    self._respond(status, json.dumps(data).encode('utf-8'),
+                  {'Content-Type': 'application/json'})
+
+  def _read_json(self):
+    length = int(self.headers.get('Content-Length') or 0)
+    if not length:
+      return {}
+    return json.loads(self.rfile.read(length).decode('utf-8'))
+
+  def _check_request(self):
+    """Applies faults and authorization. Returns False if already answered."""
+    error_status = self.server.faults.apply()
+    if error_status:
+      self._respond_json(error_status, {'detail': 'Injected error.'})
+      return False
+    if not self.headers.get('Authorization', '').startswith('Token '):
+      self._respond_json(401, {'detail': 'Authentication required.'})
+      return False
+    return True
+
+  def _stream_events(self):
+    """Sends an event after every change until the client disconnects."""
+    head = ('HTTP/1.1 200 OK\r\n'
+            'Server: %s\r\n'
+            'Content-Type: text/event-stream\r\n'
+            'Cache-Control: no-cache\r\n'
+            'Connection: close\r\n\r\n' % self.server_version)
+    self.wfile.write(head.encode('latin-1'))
+    self.log_request(200)
+    self.server.stats.count(self.command, self.path, 200)
+    self.close_connection = True
+    state = self.server.state
+    revision = state.get_revision()
+    try:
+      while True:
+        new_revision = state.wait_for_change(revision, KEEP_ALIVE_INTERVAL_SEC)
+        if new_revision == revision:
+          self.wfile.write(b': keep-alive\n\n')
+        else:
+          revision = new_revision
+          self.wfile.write(('event: changed\ndata: {"revision": %d}\n\n' %
+                            revision).encode('utf-8'))
+        self.wfile.flush()
+    except OSError:
+      pass
+
+  def do_GET(self):
+    if self.path == STATS_PATH:
+      self._respond_json(200, {'requests': self.server.stats.to_dict(),
+                               'faults': self.server.faults.to_dict()})
+      return
+    if self.path == LIST_EVENTS_PATH and self.server.push:
+      if self._check_request():
+        self._stream_events()
+      return
+    parts = urllib.parse.urlsplit(self.path)
+    if parts.path != LATEST_LIST_PATH:
+      self._respond_json(404, {'detail': 'Not found.'})
+      return
+    if not self._check_request():
+      return
+    state = self.server.state
+    etag = state.get_etag()
+    if self.headers.get('If-None-Match') == etag:
+      self._respond(304, headers={'ETag': etag})
+      return
+    headers = {'Content-Type': 'application/json', 'ETag': etag}
+    since = urllib.parse.parse_qs(parts.query).get('since')
+    delta = None
+    if since and self.server.delta:
+      try:
+        delta = state.get_delta(int(since[0]))
+      except ValueError:
+        pass
+    if delta is not None:
+      self._respond(200, json.dumps(delta).encode('utf-8'), headers)
+      return
+    body, gzipped_body = state.get_encoded()
+    if 'gzip' in self.headers.get('Accept-Encoding', ''):
+      body = gzipped_body
+      headers['Content-Encoding'] = 'gzip'
+    self._respond(200, body, headers)
+
+  def do_PATCH(self):
+    match = UPDATE_ITEM_PATH_RE.match(self.path)
+    if not match:
+      self._respond_json(404, {'detail': 'Not found.'})
+      return
+    fields = self._read_json()
+    if not self._check_request():
+      return
+    fields = {name: value for name, value in fields.items()
+              if name in EDITABLE_FIELDS}
+    item = self.server.state.update_item(int(match.group(1)), fields)
+    if item is None:
+      self._respond_json(404, {'detail': 'Not found.'})
+      return
+    self._respond_json(200, item)
+
+  def do_POST(self):
+    if self.path != CONTROL_PATH:
+      self._respond_json(404, {'detail': 'Not found.'})
+      return
+    self.server.faults.update(self._read_json())
+    self._respond_json(200, self.server.faults.to_dict())
+
+
+class FakeApiServer(http.server.ThreadingHTTPServer):
+  def __init__(self, address, state, faults, push=True, delta=True,
+               verbose=False):
+    super().__init__(address, RequestHandler)
+    self.state = state
+    self.faults = faults
+    self.push = push
+    self.delta = delta
+    self.stats = Stats()
+    self.verbose = verbose
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8000)
+  parser.add_argument('--items', type=int, default=1000,
+                      help='number of items in the intake')
+  parser.add_argument('--username',
+                      help='user owning some of the groups, like in the pref')
+  parser.add_argument('--latency-ms', type=float, default=0,
+                      help='delay added to every response')
+  parser.add_argument('--jitter-ms', type=float, default=0,
+                      help='maximum random delay added on top of latency')
+  parser.add_argument('--error-rate', type=float, default=0.0,
+                      help='share of the requests answered with an error')
+  parser.add_argument('--error-status', type=int, default=503)
+  parser.add_argument('--mutate-interval', type=float, default=0,
+                      help='seconds between changes made by other users')
+  parser.add_argument('--mutate-count', type=int, default=5,
+                      help='number of items changed at a time')
+  parser.add_argument('--no-push', action='store_true',
+                      help="don't support push updates")
+  parser.add_argument('--no-delta', action='store_true',
+                      help="don't support fetching changes since a revision")
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--verbose', action='store_true',
+                      help='log every request')
+  args = parser.parse_args()
+
+  state = IntakeState(synthetic_intake.make_payload(
+      args.items, args.username, args.seed), not args.no_delta)
+  faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate,
+                  args.error_status, args.seed)
+  server = FakeApiServer((args.host, args.port), state, faults,
+                         not args.no_push, not args.no_delta, args.verbose)
+  if args.mutate_interval:
+    Mutator(state, args.mutate_interval, args.mutate_count, args.seed).start()
+  print('Serving %d items at http://%s:%d/' % (
+      args.items, args.host, server.server_address[1]), file=sys.stderr)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+
+if __name__ == '__main__':
+  main()
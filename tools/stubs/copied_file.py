@@ -0,0 +1,42 @@
+"""Fake of the copied_file module from desktop/tools/libintake.
+
+Reads the copy header written by synthetic_intake.write_copied_file().
+"""
+
+COPIED_FROM_PREFIX = '// Copied from: '
+LAST_SYNCHRONIZED_PREFIX = '// Last synchronized: '
+
+
+class CopiedFile(object):
+  def __init__(self, path, copied_from_path, last_synchronized):
+    self.path = path
+    self._fields = {
+        'copied_from_path': copied_from_path,
+        'last_synchronized': last_synchronized,
+    }
+
+  @staticmethod
+  def create(path, reporoot, allow_caching=True):
+    """Returns the parsed file, or None if it isn't a copied file."""
+    try:
+      with open(path, encoding='utf-8') as copied_file:
+        header = [copied_file.readline() for _ in range(2)]
+    except OSError:
+      return None
+    if (not header[0].startswith(COPIED_FROM_PREFIX) or
+        not header[1].startswith(LAST_SYNCHRONIZED_PREFIX)):
+      return None
+    return CopiedFile(path,
+                      header[0][len(COPIED_FROM_PREFIX):].strip(),
+                      header[1][len(LAST_SYNCHRONIZED_PREFIX):].strip())
+
+  def __getitem__(self, key):
+    return self._fields[key]
+
+  def set_last_sync(self, sha):
+    with open(self.path, encoding='utf-8') as copied_file:
+      lines = copied_file.readlines()
+    lines[1] = '%s%s\n' % (LAST_SYNCHRONIZED_PREFIX, sha)
+    with open(self.path, 'w', encoding='utf-8') as copied_file:
+      copied_file.writelines(lines)
+    self._fields['last_synchronized'] = sha
@@ -0,0 +1,318 @@
+"""Minimal stand-in for the sublime module of Sublime Text 3.
+
+Implements only the parts of the API that iwilldo.py uses, so that the
+plugin can be exercised outside of the editor. Callbacks passed to
+set_timeout are queued until run_timeouts is called.
+"""
+
+import bisect
+import os.path
+import tempfile
+import threading
+
+HIDDEN = 128
+DRAW_NO_FILL = 32
+DRAW_NO_OUTLINE = 256
+DRAW_SOLID_UNDERLINE = 512
+
+_timeouts_lock = threading.Lock()
+_timeouts = []
+_cache_path = os.path.join(tempfile.gettempdir(), 'IntakeToolkitStubCache')
+
+
+def set_timeout(callback, delay=0):
+  with _timeouts_lock:
+    _timeouts.append(callback)
+
+
+def set_timeout_async(callback, delay=0):
+  set_timeout(callback, delay)
+
+
+def run_timeouts():
+  """Runs queued callbacks, including the ones queued in the meantime."""
+  while True:
+    with _timeouts_lock:
+      if not _timeouts:
+        return
+      callback = _timeouts.pop(0)
+    callback()
+
+
+def platform():
+  return 'linux'
+
+
+def cache_path():
+  return _cache_path
+
+
+def set_cache_path(path):
+  global _cache_path
+  _cache_path = path
+
+
+def error_message(message):
+  print('error: %s' % message)
+
+
+def status_message(message):
+  pass
+
+
+class Settings(object):
+  def __init__(self):
+    self._values = {}
+
+  def get(self, name, default=None):
+    return self._values.get(name, default)
+
+  def set(self, name, value):
+    self._values[name] = value
+
+  def has(self, name):
+    return name in self._values
+
+  def erase(self, name):
+    self._values.pop(name, None)
+
+
+def load_settings(name):
+  return Settings()
+
+
+class Region(object):
+  __slots__ = ('a', 'b')
+
+  def __init__(self, a, b=None):
+    self.a = a
+    self.b = a if b is None else b
+
+  def begin(self):
+    return min(self.a, self.b)
+
+  def end(self):
+    return max(self.a, self.b)
+
+  def size(self):
+    return abs(self.b - self.a)
+
+  def __eq__(self, other):
+    return (self.a, self.b) == (other.a, other.b)
+
+  def __repr__(self):
+    return 'Region(%d, %d)' % (self.a, self.b)
+
+
+class Selection(object):
+  def __init__(self):
+    self._regions = [Region(0)]
+
+  def clear(self):
+    self._regions = []
+
+  def add(self, region):
+    self._regions.append(region)
+
+  def __getitem__(self, index):
+    return self._regions[index]
+
+  def __iter__(self):
+    return iter(self._regions)
+
+  def __len__(self):
+    return len(self._regions)
+
+
+class Window(object):
+  def __init__(self):
+    self._views = []
+
+  def new_file(self):
+    view = View(self)
+    self._views.append(view)
+    return view
+
+  def views(self):
+    return list(self._views)
+
+  def active_view(self):
+    return self._views[-1] if self._views else None
+
+  def num_groups(self):
+    return 1
+
+  def active_view_in_group(self, group):
+    return self.active_view()
+
+  def focus_view(self, view):
+    pass
+
+  def open_file(self, path, flags=0):
+    return self.new_file()
+
+  def show_quick_panel(self, items, on_done, *args, **kwargs):
+    pass
+
+  def create_output_panel(self, name):
+    return View(self)
+
+  def run_command(self, name, args=None):
+    pass
+
+
+class View(object):
+  _last_id = 0
+
+  def __init__(self, window):
+    View._last_id += 1
+    self._id = View._last_id
+    self._window = window
+    self._settings = Settings()
+    self._text = ''
+    # Offsets at which the lines start.
+    self._line_starts = [0]
+    # Whether starts of all the lines are known.
+    self._line_starts_complete = True
+    # Mapping from the key to a (regions, edit count) tuple. Regions are
+    # moved by the edits made since, when they are read.
+    self._regions = {}
+    # List of (start, end, delta) tuples describing all the edits.
+    self._edits = []
+    self._selection = Selection()
+    self._scratch = False
+    # Command instances are kept for the lifetime of the view, as in Sublime.
+    self._commands = {}
+
+  def id(self):
+    return self._id
+
+  def buffer_id(self):
+    return self._id
+
+  def window(self):
+    return self._window
+
+  def settings(self):
+    return self._settings
+
+  def set_name(self, name):
+    self._name = name
+
+  def set_scratch(self, scratch):
+    self._scratch = scratch
+
+  def is_scratch(self):
+    return self._scratch
+
+  def set_read_only(self, read_only):
+    pass
+
+  def set_syntax_file(self, syntax_file):
+    pass
+
+  def assign_syntax(self, syntax):
+    pass
+
+  def viewport_position(self):
+    return (0.0, 0.0)
+
+  def set_viewport_position(self, position, animate=True):
+    pass
+
+  def show(self, location, show_surrounds=True):
+    pass
+
+  def sel(self):
+    return self._selection
+
+  def size(self):
+    return len(self._text)
+
+  def substr(self, region):
+    return self._text[region.begin():region.end()]
+
+  def _find_line_starts(self, row=None, point=None):
+    """Finds starts of the lines up to the given row, or past the point.
+
+    Line starts after an edit are only found when they are needed, so that
+    edits applied from the bottom up don't rescan the rest of the text.
+    """
+    line_starts = self._line_starts
+    while not self._line_starts_complete and (
+        (row is not None and row >= len(line_starts)) or
+        (point is not None and line_starts[-1] <= point)):
+      index = self._text.find('\n', line_starts[-1])
+      if index == -1:
+        self._line_starts_complete = True
+      else:
+        line_starts.append(index + 1)
+
+  def text_point(self, row, col):
+    self._find_line_starts(row=row)
+    if row >= len(self._line_starts):
+      return len(self._text)
+    return min(self._line_starts[row] + col, len(self._text))
+
+  def rowcol(self, point):
+    self._find_line_starts(point=point)
+    row = bisect.bisect_right(self._line_starts, point) - 1
+    return (row, point - self._line_starts[row])
+
+  def replace(self, edit, region, text):
+    start, end = region.begin(), region.end()
+    delta = len(text) - (end - start)
+    self._text = self._text[:start] + text + self._text[end:]
+    # Lines starting after the start of the replaced text are found again.
+    self._find_line_starts(point=start)
+    del self._line_starts[bisect.bisect_right(self._line_starts, start):]
+    self._line_starts_complete = False
+    self._edits.append((start, end, delta))
+
+  def _move_regions(self, regions, edits):
+    """Moves regions the way Sublime does it when the text is edited."""
+    for start, end, delta in edits:
+      for region in regions:
+        for attr in ('a', 'b'):
+          point = getattr(region, attr)
+          if point >= end:
+            setattr(region, attr, point + delta)
+          elif point > start:
+            setattr(region, attr, start)
+
+  def insert(self, edit, point, text):
+    self.replace(edit, Region(point), text)
+    return len(text)
+
+  def erase(self, edit, region):
+    self.replace(edit, region, '')
+
+  def add_regions(self, key, regions, scope='', icon='', flags=0):
+    self._regions[key] = ([Region(region.a, region.b) for region in regions],
+                          len(self._edits))
+
+  def get_regions(self, key):
+    if key not in self._regions:
+      return []
+    regions, edit_count = self._regions[key]
+    self._move_regions(regions, self._edits[edit_count:])
+    self._regions[key] = (regions, len(self._edits))
+    return [Region(region.a, region.b) for region in regions]
+
+  def erase_regions(self, key):
+    self._regions.pop(key, None)
+
+  def set_status(self, key, value):
+    pass
+
+  def erase_status(self, key):
+    pass
+
+  def run_command(self, name, args=None):
+    import sublime_plugin
+    if name not in self._commands:
+      command_class = sublime_plugin.find_command_class(name)
+      if command_class is None:
+        return
+      self._commands[name] = command_class(self)
+    self._commands[name].run(None, **(args or {}))
@@ -0,0 +1,40 @@
+"""Minimal stand-in for the sublime_plugin module of Sublime Text 3."""
+
+import re
+
+# Mapping from the command name to the class implementing it.
+_command_classes = {}
+
+
+def _get_command_name(class_name):
+  if class_name.endswith('Command'):
+    class_name = class_name[:-len('Command')]
+  return re.sub(r'(?<!^)([A-Z])', r'_\1', class_name).lower()
+
+
+class _CommandMeta(type):
+  def __init__(cls, name, bases, namespace):
+    super().__init__(name, bases, namespace)
+    _command_classes[_get_command_name(name)] = cls
+
+
+def find_command_class(name):
+  return _command_classes.get(name)
+
+
+class TextCommand(metaclass=_CommandMeta):
+  def __init__(self, view):
+    self.view = view
+
+
+class WindowCommand(metaclass=_CommandMeta):
+  def __init__(self, window):
+    self.window = window
+
+
+class ApplicationCommand(metaclass=_CommandMeta):
+  pass
+
+
+class EventListener(object):
+  pass
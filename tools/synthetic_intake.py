@@ -0,0 +1,92 @@
+"""Generates synthetic IWillDo intakes for benchmarks and local testing."""
+
+import os
+import random
+import shutil
+
+# The fake copied_file module installed in the synthetic repositories.
+COPIED_FILE_MODULE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'stubs', 'copied_file.py')
+# Domain of the owners' e-mail addresses.
+MAIL_DOMAIN = 'opera.com'
+# Number of items in a single group of the list.
+GROUP_SIZE = 50
+# Number of distinct users owning and claiming the items.
+USER_COUNT = 40
+# Number of lines following the copy header in the synthetic files.
+COPIED_FILE_BODY_LINES = 40
+BASE_COMMIT = '0123456789abcdef0123456789abcdef01234567'
+PREVIOUS_COMMIT = 'fedcba9876543210fedcba9876543210fedcba98'
+
+
+def get_username(index):
+  return 'user%d' % index
+
+
+def get_item_name(index):
+  return 'chrome/browser/module%d/file_%d.cc' % (index // 20, index)
+
+
+def make_payload(item_count, username=None, seed=0):
+  """Returns a list in the format of the API_LATEST_LIST_URL response.
+
+  If given, username owns about a tenth of the groups and claims some of the
+  items.
+  """
+  rng = random.Random(seed)
+  usernames = [get_username(index) for index in range(USER_COUNT)]
+  if username:
+    usernames[0] = username
+  groups = []
+  for start in range(0, item_count, GROUP_SIZE):
+    owners = rng.sample(usernames, rng.randint(1, 3))
+    items = []
+    for index in range(start, min(start + GROUP_SIZE, item_count)):
+      claimed_by = rng.sample(owners, rng.randint(0, len(owners)))
+      items.append({
+          'id': index + 1,
+          'name': get_item_name(index),
+          'claimed_by': ' '.join(claimed_by),
+          'closed': rng.random() < 0.2,
+      })
+    groups.append({
+        'title': ','.join('%s@%s' % (owner, MAIL_DOMAIN) for owner in owners),
+        'items': items,
+    })
+  return {
+      'bts_issue': 'DNA-%d' % (10000 + item_count),
+      'title': 'Synthetic intake of %d files' % item_count,
+      'base_commit': BASE_COMMIT,
+      'groups': groups,
+  }
+
+
+def write_copied_file(path, copied_from_path, last_synchronized):
+  """Writes a file with the header read by the fake copied_file module."""
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'w', encoding='utf-8') as copied_file:
+    copied_file.write('// Copied from: %s\n' % copied_from_path)
+    copied_file.write('// Last synchronized: %s\n' % last_synchronized)
+    for line in range(COPIED_FILE_BODY_LINES):
+      copied_file.write('int synthetic_%d = %d;\n' % (line, line))
+
+
+def write_repository(reporoot, payload, seed=0):
+  """Creates copied files of the payload items under reporoot.
+
+  Half of the files are synchronized with the base commit. Every twentieth
+  item has no file at all. The libintake package gets the fake copied_file
+  module.
+  """
+  rng = random.Random(seed)
+  lib_path = os.path.join(reporoot, 'desktop', 'tools', 'libintake')
+  os.makedirs(lib_path, exist_ok=True)
+  shutil.copy(COPIED_FILE_MODULE, lib_path)
+  for group in payload['groups']:
+    for item in group['items']:
+      if item['id'] % 20 == 0:
+        continue
+      last_synchronized = (payload['base_commit'] if rng.random() < 0.5
+                           else PREVIOUS_COMMIT)
+      write_copied_file(os.path.join(reporoot, item['name']),
+                        'chromium/src/%s' % item['name'], last_synchronized)